@@ -1,15 +1,373 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import (Blueprint, Flask, Response, abort, jsonify, make_response, render_template, request, redirect,
+                   session, url_for, flash, g, has_request_context, stream_template, stream_with_context,
+                   appcontext_pushed, before_render_template, template_rendered)
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from sqlalchemy import Index, text
+from jinja2 import FileSystemBytecodeCache
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import base64
+import binascii
+import bisect
+import csv
+import functools
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import click
+import contextvars
+from sqlalchemy import Index, bindparam, case, create_engine, event, func, inspect, text, tuple_
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.sql import select, delete, insert, update
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///library.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('BOOKMANAGER_DATABASE_URI', 'sqlite:///library.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'your-secret-key'
+# Connection pool settings for the shared engine. check_same_thread is off
+# because pooled connections are handed between threaded workers.
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30,
+    'pool_pre_ping': True,
+    'connect_args': {'timeout': 30, 'check_same_thread': False},
+}
+# Pragmas applied to every new pooled SQLite connection
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': 'WAL',        # readers don't block the writer
+    'synchronous': 'NORMAL',      # durable at checkpoints, safe with WAL
+    'cache_size': -64000,         # 64 MB page cache per connection
+    'mmap_size': 268435456,       # 256 MB memory-mapped I/O
+    'busy_timeout': 30000,        # wait for the write lock instead of failing
+    'temp_store': 'MEMORY',
+}
+app.config['BOOKS_PER_PAGE'] = 50
+app.config['BOOKS_MAX_PER_PAGE'] = 500
+app.config['FACET_TOP_AUTHORS'] = 20
+app.config['FACET_INDEX_MAX_STALENESS'] = 30
+app.config['SEARCH_RESULT_LIMIT'] = 50
+app.config['SEARCH_MAX_RESULT_LIMIT'] = 500
+app.config['IMPORT_BATCH_SIZE'] = 5000
+app.config['EXPORT_CHUNK_SIZE'] = 1000
+# (id, name) option lists for the book form's pickers
+app.config['LOOKUP_CACHE_TTL'] = 300
+app.config['LOOKUP_CACHE_MAX_ENTRIES'] = 32
+# Validate cached lists against cache_versions so invalidations reach every worker
+app.config['LOOKUP_CACHE_SHARED'] = False
+app.config['SUGGEST_LIMIT'] = 10
+app.config['SUGGEST_MAX_LIMIT'] = 50
+app.config['BOOK_DETAILS_CACHE_TTL'] = 3600
+app.config['BOOK_DETAILS_CACHE_MAX_ENTRIES'] = 2048
+app.config['PAGE_CACHE_TTL'] = 3600
+app.config['PAGE_CACHE_MAX_ENTRIES'] = 512
+app.config['API_PER_PAGE'] = 100
+app.config['API_MAX_PER_PAGE'] = 1000
+app.config['REPORT_PER_PAGE'] = 50
+# Request/SQL/template instrumentation exposed at /metrics
+app.config['METRICS_ENABLED'] = True
+app.config['METRICS_LATENCY_BUCKETS'] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statements slower than this are logged with their parameters and query plan
+app.config['SLOW_QUERY_THRESHOLD_MS'] = 200
+app.config['SLOW_QUERY_EXPLAIN'] = True
+app.config['REPORT_MAX_PER_PAGE'] = 1000
+# Background jobs (flask run-jobs)
+app.config['JOB_WORKERS'] = 2
+app.config['JOB_MAX_ATTEMPTS'] = 3
+app.config['JOB_RETRY_DELAY'] = 30       # seconds, doubled after each failed attempt
+app.config['JOB_POLL_INTERVAL'] = 1.0
+app.config['JOB_LEASE_TIMEOUT'] = 600    # a running job without a heartbeat for this long is re-queued
+app.config['JOB_HEARTBEAT_INTERVAL'] = 30  # how often a worker renews the lease of the job it runs
+app.config['JOB_IMPORT_DIR'] = None      # directory imports submitted over HTTP must live in
 
-db = SQLAlchemy(app)
+# GET-only routes read through a separate engine (see read_engine()). When
+# READ_DATABASE_URI is unset it is a mode=ro connection pool on the same SQLite
+# file; point it at a replica or snapshot copy to move reads off the primary.
+app.config['READ_ROUTING_ENABLED'] = True
+app.config['READ_DATABASE_URI'] = os.environ.get('BOOKMANAGER_READ_DATABASE_URI')
+
+# Templates are compiled once at startup (bytecode kept on disk for the next
+# process). Lists with at least STREAM_TEMPLATE_MIN_ROWS rows are streamed
+# with stream_template in chunks of about STREAM_TEMPLATE_CHUNK_SIZE characters.
+app.config['TEMPLATE_PRELOAD'] = True
+app.config['TEMPLATE_BYTECODE_CACHE_DIR'] = None  # defaults to <instance>/jinja_cache
+app.config['STREAM_TEMPLATE_MIN_ROWS'] = 200
+app.config['STREAM_TEMPLATE_CHUNK_SIZE'] = 16384
+# Refuse to start against a database whose schema is behind MIGRATIONS, or
+# bring it up to date (one process only: migrations are not safe to race).
+app.config['SCHEMA_AUTO_UPGRADE'] = False
+
+# Multi-library sharding. When enabled, the TENANT_HEADER request header (set
+# by the proxy in front of each branch) selects that branch's own database file
+# in TENANT_DATABASE_DIR; requests without it, or naming DEFAULT_TENANT, use
+# the configured database. CLI commands take the branch from BOOKMANAGER_TENANT.
+app.config['SHARDING_ENABLED'] = os.environ.get('BOOKMANAGER_SHARDING') == '1'
+app.config['TENANT_HEADER'] = 'X-Library-Tenant'
+app.config['DEFAULT_TENANT'] = 'main'
+app.config['TENANTS'] = None               # branch names; None = every *.db in TENANT_DATABASE_DIR
+app.config['TENANT_DATABASE_DIR'] = None   # defaults to <instance>/tenants
+app.config['TENANT_ENGINE_IDLE_TIMEOUT'] = 300
+app.config['TENANT_ENGINE_MAX_OPEN'] = 64
+app.config['TENANT_LIST_TTL'] = 30         # seconds between rescans of TENANT_DATABASE_DIR
+app.config['TENANT_FANOUT_WORKERS'] = 8
+
+class TenantSQLAlchemy(SQLAlchemy):
+    # db.engine and db.session follow the current tenant: the default tenant
+    # keeps the configured engine, every other tenant gets its shard's engine
+    @property
+    def engines(self):
+        engines = super().engines
+        tenant = current_tenant()
+        if tenant is None:
+            return engines
+        return {**engines, None: shard_engines.get(tenant)}
+
+# Bound to the app by create_app()
+db = TenantSQLAlchemy()
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in app.config['SQLITE_PRAGMAS'].items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+    finally:
+        cursor.close()
+
+# Tenant routing
+TENANT_NAME_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+_tenant_override = contextvars.ContextVar('tenant_override', default=None)
+
+def current_tenant():
+    # None means the default database
+    if not app.config['SHARDING_ENABLED']:
+        return None
+    tenant = _tenant_override.get()
+    if tenant is None:
+        tenant = g.get('tenant') if has_request_context() else os.environ.get('BOOKMANAGER_TENANT')
+    return None if tenant == app.config['DEFAULT_TENANT'] else tenant
+
+def tenant_name(tenant=None):
+    return tenant or app.config['DEFAULT_TENANT']
+
+def tenant_key(key):
+    # Cache key scoped to the current tenant, so branches never share entries
+    return (current_tenant(), key)
+
+@contextmanager
+def use_tenant(tenant):
+    token = _tenant_override.set(tenant)
+    try:
+        yield
+    finally:
+        _tenant_override.reset(token)
+
+def default_engine():
+    # The configured database, whatever the current tenant (job queue, read replica)
+    with use_tenant(app.config['DEFAULT_TENANT']):
+        return db.engine
+
+def get_tenant_dir():
+    return app.config['TENANT_DATABASE_DIR'] or os.path.join(app.instance_path, 'tenants')
+
+# Scanned tenant directories: directory -> (names, expires). Rescanned after
+# TENANT_LIST_TTL, and cleared when this process creates a shard database, so
+# a branch created by another process shows up within the TTL.
+_tenant_dirs = {}
+
+def list_tenants():
+    tenants = app.config['TENANTS']
+    if tenants is None:
+        tenants = _scan_tenant_dir(get_tenant_dir())
+    return [app.config['DEFAULT_TENANT'], *(t for t in tenants if t != app.config['DEFAULT_TENANT'])]
+
+def _scan_tenant_dir(directory):
+    now = time.monotonic()
+    cached = _tenant_dirs.get(directory)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    tenants = sorted(name[:-3] for name in os.listdir(directory)
+                     if name.endswith('.db')) if os.path.isdir(directory) else []
+    _tenant_dirs[directory] = (tenants, now + app.config['TENANT_LIST_TTL'])
+    return tenants
+
+def invalidate_tenant_list():
+    _tenant_dirs.clear()
+
+class ShardEngines:
+    # Engines for tenant shards, opened on first use. Opening one also disposes
+    # shards idle for longer than TENANT_ENGINE_IDLE_TIMEOUT and keeps at most
+    # TENANT_ENGINE_MAX_OPEN engines (least recently used go first). Lookups of
+    # an open engine only record the time of use, without taking the lock.
+    def __init__(self):
+        self._engines = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant):
+        now = time.monotonic()
+        engine = self._engines.get(tenant)
+        if engine is None:
+            with self._lock:
+                engine = self._engines.get(tenant)
+                if engine is None:
+                    engine = self._engines[tenant] = self._create(tenant)
+                    self._last_used[tenant] = now
+                    self._evict(now)
+        self._last_used[tenant] = now
+        return engine
+
+    def _create(self, tenant):
+        directory = get_tenant_dir()
+        os.makedirs(directory, exist_ok=True)
+        engine = create_engine(f"sqlite:///{os.path.join(directory, tenant + '.db')}",
+                               **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        event.listen(engine, 'connect', apply_sqlite_pragmas)
+        # The first connection creates the database file of a new branch
+        event.listen(engine, 'first_connect', lambda *args: invalidate_tenant_list())
+        instrument_engine(engine)
+        return engine
+
+    def _evict(self, now):
+        timeout = app.config['TENANT_ENGINE_IDLE_TIMEOUT']
+        by_age = sorted(self._engines, key=lambda tenant: self._last_used.get(tenant, now))
+        for tenant in by_age:
+            if now - self._last_used.get(tenant, now) > timeout \
+                    or len(self._engines) > app.config['TENANT_ENGINE_MAX_OPEN']:
+                # Connections still checked out finish normally; the pool is
+                # just no longer handed out
+                self._engines.pop(tenant).dispose()
+                self._last_used.pop(tenant, None)
+
+    def dispose_all(self, close=True):
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose(close=close)
+            self._engines.clear()
+            self._last_used.clear()
+
+shard_engines = ShardEngines()
+
+@app.before_request
+def resolve_tenant():
+    if not app.config['SHARDING_ENABLED']:
+        return
+    tenant = request.headers.get(app.config['TENANT_HEADER'])
+    if not tenant or tenant == app.config['DEFAULT_TENANT']:
+        return
+    if not TENANT_NAME_RE.match(tenant) or tenant not in list_tenants():
+        abort(404, f'Unknown library: {tenant}')
+    g.tenant = tenant
+
+@app.after_request
+def vary_on_tenant(response):
+    if app.config['SHARDING_ENABLED']:
+        response.vary.add(app.config['TENANT_HEADER'])
+    return response
+
+# Cross-shard queries
+# fan_out() runs fn(conn) on every branch in parallel on a shared thread pool
+# and returns {branch name: result}. Engines are resolved up front, in the
+# calling request's context.
+_fanout_pool = None
+_fanout_lock = threading.Lock()
+
+def get_fanout_pool():
+    global _fanout_pool
+    with _fanout_lock:
+        if _fanout_pool is None:
+            _fanout_pool = ThreadPoolExecutor(max_workers=app.config['TENANT_FANOUT_WORKERS'],
+                                              thread_name_prefix='fanout')
+    return _fanout_pool
+
+def fan_out(fn, tenants=None):
+    engines = {}
+    for name in tenants or list_tenants():
+        tenant = None if name == app.config['DEFAULT_TENANT'] else name
+        engines[name] = get_read_engine() if tenant is None else shard_engines.get(tenant)
+
+    def run(name, engine):
+        # Pool threads start without an app context or tenant
+        with app.app_context(), use_tenant(name), engine.connect() as conn:
+            return fn(conn)
+
+    pool = get_fanout_pool()
+    futures = {name: pool.submit(run, name, engine) for name, engine in engines.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+def wants_all_branches(source):
+    return app.config['SHARDING_ENABLED'] and source.get('scope') == 'all'
+
+# Read routing
+# Reads for the endpoints below go to the read engine; everything else, and
+# any request right after a redirecting POST (read-your-writes), uses the
+# primary db.engine.
+READ_ONLY_ENDPOINTS = {
+    'index', 'search_books', 'book_details',
+    'list_authors', 'list_publishers', 'list_genres',
+    'books_by_genre', 'authors_by_books',
+}
+_read_engine = None
+_read_engine_lock = threading.Lock()
+
+def apply_read_pragmas(dbapi_connection, connection_record):
+    # journal_mode can only be changed by a writer; the primary has set WAL
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in app.config['SQLITE_PRAGMAS'].items():
+            if pragma != 'journal_mode':
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+        cursor.execute('PRAGMA query_only = ON')
+    finally:
+        cursor.close()
+
+def get_read_engine():
+    global _read_engine
+    if _read_engine is not None:
+        return _read_engine
+    with _read_engine_lock:
+        if _read_engine is None:
+            uri = app.config['READ_DATABASE_URI']
+            primary = default_engine()
+            url = primary.url
+            if uri is None and (url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:')):
+                _read_engine = primary
+            else:
+                uri = uri or f'sqlite:///file:{url.database}?mode=ro&uri=true'
+                engine = create_engine(uri, **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+                if engine.url.get_backend_name() == 'sqlite':
+                    event.listen(engine, 'connect', apply_read_pragmas)
+                instrument_engine(engine)
+                _read_engine = engine
+    return _read_engine
+
+def read_engine():
+    # Engine for the current request's reads
+    if has_request_context():
+        return g.get('read_engine', db.engine)
+    return db.engine
+
+@app.before_request
+def route_reads():
+    read_primary = session.pop('_read_primary', False)
+    if (app.config['READ_ROUTING_ENABLED'] and not read_primary
+            and request.endpoint in READ_ONLY_ENDPOINTS and current_tenant() is None):
+        g.read_engine = get_read_engine()
+
+@app.after_request
+def remember_write(response):
+    # The page a POST redirects to must see its write even if the read
+    # engine lags behind the primary
+    if request.method == 'POST' and request.endpoint not in READ_ONLY_ENDPOINTS \
+            and 300 <= response.status_code < 400:
+        session['_read_primary'] = True
+    return response
 
 # Association tables for many-to-many relationships
 book_authors = db.Table('book_authors',
@@ -22,6 +380,62 @@ book_genres = db.Table('book_genres',
     db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'), primary_key=True)
 )
 
+# Single-row table of maintained totals for the home page dashboard.
+# Kept current by the triggers in STATS_TRIGGERS; rebuilt with `flask rebuild-stats`.
+catalog_stats = db.Table('catalog_stats',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('total_books', db.Integer, nullable=False, default=0),
+    db.Column('total_authors', db.Integer, nullable=False, default=0),
+    db.Column('total_genres', db.Integer, nullable=False, default=0),
+    db.Column('total_publishers', db.Integer, nullable=False, default=0)
+)
+
+# Materialized report aggregates, maintained incrementally by REPORT_TRIGGERS
+genre_book_counts = db.Table('genre_book_counts',
+    db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'), primary_key=True),
+    db.Column('book_count', db.Integer, nullable=False, default=0)
+)
+
+author_book_counts = db.Table('author_book_counts',
+    db.Column('author_id', db.Integer, db.ForeignKey('author.id'), primary_key=True),
+    db.Column('book_count', db.Integer, nullable=False, default=0)
+)
+
+# Last time each report's summary table changed
+report_status = db.Table('report_status',
+    db.Column('name', db.String(50), primary_key=True),
+    db.Column('updated_at', db.DateTime, nullable=False)
+)
+
+# Single-row catalog-wide version, bumped by triggers on every catalog write.
+# Drives ETag/Last-Modified and the rendered page cache for the list pages.
+catalog_version = db.Table('catalog_version',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('version', db.Integer, nullable=False, default=0),
+    db.Column('updated_at', db.DateTime, nullable=False)
+)
+
+# Per-name version counters used to broadcast cache invalidations between
+# worker processes that share the database file.
+cache_versions = db.Table('cache_versions',
+    db.Column('name', db.String(50), primary_key=True),
+    db.Column('version', db.Integer, nullable=False, default=0)
+)
+
+# Holds a row while a bulk write has the per-row search-index and
+# catalog-version triggers suspended (see deferred_catalog_triggers). Only
+# ever non-empty inside that writer's own transaction.
+trigger_suspend = db.Table('trigger_suspend',
+    db.Column('id', db.Integer, primary_key=True)
+)
+
+# Applied schema migrations (see MIGRATIONS)
+schema_migrations = db.Table('schema_migrations',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('name', db.String(100), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False)
+)
+
 # Models
 class Book(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -31,9 +445,9 @@ class Book(db.Model):
     copies_available = db.Column(db.Integer, default=1)
     publisher_id = db.Column(db.Integer, db.ForeignKey('publisher.id'))
     publisher = db.relationship('Publisher', backref=db.backref('books', lazy=True))
-    authors = db.relationship('Author', secondary=book_authors, lazy='subquery',
+    authors = db.relationship('Author', secondary=book_authors, lazy='selectin',
                               backref=db.backref('books', lazy=True))
-    genres = db.relationship('Genre', secondary=book_genres, lazy='subquery',
+    genres = db.relationship('Genre', secondary=book_genres, lazy='selectin',
                              backref=db.backref('books', lazy=True))
 
     def __repr__(self):
@@ -63,14 +477,52 @@ class Publisher(db.Model):
 
     def __repr__(self):
         return f'<Publisher {self.name}>'
+
+class Loan(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
+    borrower = db.Column(db.String(100), nullable=True)
+    checked_out_at = db.Column(db.DateTime, nullable=False)
+    returned_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<Loan {self.id} book={self.book_id}>'
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=1)
+    progress_done = db.Column(db.Integer, nullable=True)
+    progress_total = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(50), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    run_after = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
 # Create database indexes
 Index('ix_book_title', Book.title)
-Index('ix_book_isbn', Book.isbn, unique=True)  # Although already unique by constraint
 Index('ix_book_publication_date', Book.publication_date)
 Index('ix_book_copies_available', Book.copies_available)
+Index('ix_book_publisher_id', Book.publisher_id)
+# Reverse lookups on the association tables (their primary keys lead with book_id)
+Index('ix_book_authors_author_id', book_authors.c.author_id, book_authors.c.book_id)
+Index('ix_book_genres_genre_id', book_genres.c.genre_id, book_genres.c.book_id)
 Index('ix_author_name', Author.name)
 Index('ix_genre_name', Genre.name)
 Index('ix_publisher_name', Publisher.name)
+Index('ix_loan_book_id', Loan.book_id)
+Index('ix_job_status_run_after', Job.status, Job.run_after)
+Index('ix_genre_book_counts_count', genre_book_counts.c.book_count.desc(), genre_book_counts.c.genre_id)
+Index('ix_author_book_counts_count', author_book_counts.c.book_count.desc(), author_book_counts.c.author_id)
 
 # Create stored procedures (SQLite doesn't support true stored procedures, so we use SQL functions)
 # These will be created when the database is initialized
@@ -114,44 +566,895 @@ STORED_PROCEDURES = [
     """
 ]
 
-# Routes
-@app.route('/')
-def index():
-    stmt = select(Book).order_by(Book.title)
-    
-    count_books_stmt = text("SELECT COUNT(*) FROM book")
-    count_authors_stmt = text("SELECT COUNT(*) FROM author")
-    count_genres_stmt = text("SELECT COUNT(*) FROM genre")
-    count_publishers_stmt = text("SELECT COUNT(*) FROM publisher")
+# Triggers keeping catalog_stats in step with inserts and deletes on each table
+STATS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_{action.lower()}
+    AFTER {action} ON {table}
+    BEGIN
+        UPDATE catalog_stats SET {column} = {column} {op} 1 WHERE id = 1;
+    END
+    """
+    for table, column in [('book', 'total_books'), ('author', 'total_authors'),
+                          ('genre', 'total_genres'), ('publisher', 'total_publishers')]
+    for action, op in [('INSERT', '+'), ('DELETE', '-')]
+]
 
-    with db.engine.connect() as conn:
-        books = conn.execute(stmt).all()
-        total_books = conn.execute(count_books_stmt).scalar()
-        total_authors = conn.execute(count_authors_stmt).scalar()
-        total_genres = conn.execute(count_genres_stmt).scalar()
-        total_publishers = conn.execute(count_publishers_stmt).scalar()
-
-    return render_template(
-        'index.html',
+# FTS5 full-text index over books, keyed by book id (rowid). Each document
+# carries the denormalized author, genre and publisher names for the book.
+BOOK_FTS_DOCUMENT = """
+    SELECT
+        b.id,
+        b.title,
+        b.isbn || ' ' || replace(b.isbn, '-', ''),
+        (SELECT group_concat(a.name, ' ') FROM book_authors ba
+         JOIN author a ON a.id = ba.author_id WHERE ba.book_id = b.id),
+        (SELECT group_concat(g.name, ' ') FROM book_genres bg
+         JOIN genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id),
+        (SELECT p.name FROM publisher p WHERE p.id = b.publisher_id)
+    FROM book b
+"""
+
+def _refresh_fts_sql(book_id_expr):
+    return f"""
+        DELETE FROM book_fts WHERE rowid = {book_id_expr};
+        INSERT INTO book_fts (rowid, title, isbn, authors, genres, publisher)
+        {BOOK_FTS_DOCUMENT} WHERE b.id = {book_id_expr};
+    """
+
+def _refresh_fts_for_sql(where_clause):
+    return f"""
+        DELETE FROM book_fts WHERE rowid IN (SELECT b.id FROM book b WHERE {where_clause});
+        INSERT INTO book_fts (rowid, title, isbn, authors, genres, publisher)
+        {BOOK_FTS_DOCUMENT} WHERE {where_clause};
+    """
+
+# Skips a per-row trigger while a bulk write re-indexes its books itself
+UNLESS_SUSPENDED = "WHEN NOT EXISTS (SELECT 1 FROM trigger_suspend)"
+
+# Per-row triggers suspended by deferred_catalog_triggers; dropped and
+# recreated by migration 3, which added the guard
+SUSPENDABLE_TRIGGERS = [
+    'trg_book_fts_insert', 'trg_book_fts_update_doc',
+    'trg_book_authors_fts_insert', 'trg_book_authors_fts_delete',
+    'trg_book_genres_fts_insert', 'trg_book_genres_fts_delete',
+] + [
+    f'trg_{table}_catalog_version_{action}'
+    for table in ['book', 'author', 'genre', 'publisher', 'book_authors', 'book_genres']
+    for action in ['insert', 'update', 'delete']
+]
+
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5(
+        title, isbn, authors, genres, publisher,
+        tokenize = 'unicode61', prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_book_fts_insert AFTER INSERT ON book {UNLESS_SUSPENDED}
+    BEGIN {_refresh_fts_sql('new.id')} END
+    """,
+    f"""
+    DROP TRIGGER IF EXISTS trg_book_fts_update
+    """,
+    # Only columns that appear in the document; stock updates skip the index
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_book_fts_update_doc AFTER UPDATE OF title, isbn, publisher_id ON book
+    {UNLESS_SUSPENDED}
+    BEGIN
+        DELETE FROM book_fts WHERE rowid = old.id;
+        {_refresh_fts_sql('new.id')}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_book_fts_delete AFTER DELETE ON book
+    BEGIN
+        DELETE FROM book_fts WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_book_authors_fts_insert AFTER INSERT ON book_authors {UNLESS_SUSPENDED}
+    BEGIN {_refresh_fts_sql('new.book_id')} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_book_authors_fts_delete AFTER DELETE ON book_authors {UNLESS_SUSPENDED}
+    BEGIN {_refresh_fts_sql('old.book_id')} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_book_genres_fts_insert AFTER INSERT ON book_genres {UNLESS_SUSPENDED}
+    BEGIN {_refresh_fts_sql('new.book_id')} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_book_genres_fts_delete AFTER DELETE ON book_genres {UNLESS_SUSPENDED}
+    BEGIN {_refresh_fts_sql('old.book_id')} END
+    """,
+    # Renames of authors, genres and publishers change the documents of their books
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_author_fts_rename AFTER UPDATE OF name ON author
+    BEGIN {_refresh_fts_for_sql('b.id IN (SELECT book_id FROM book_authors WHERE author_id = new.id)')} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_genre_fts_rename AFTER UPDATE OF name ON genre
+    BEGIN {_refresh_fts_for_sql('b.id IN (SELECT book_id FROM book_genres WHERE genre_id = new.id)')} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_publisher_fts_rename AFTER UPDATE OF name ON publisher
+    BEGIN {_refresh_fts_for_sql('b.publisher_id = new.id')} END
+    """
+]
+
+def refresh_search_index(conn, book_ids):
+    # Re-index the given books with one DELETE and one INSERT per chunk
+    book_ids = sorted(book_ids)
+    statements = [
+        text(sql).bindparams(bindparam('book_ids', expanding=True))
+        for sql in _refresh_fts_for_sql('b.id IN :book_ids').split(';') if sql.strip()
+    ]
+    for start in range(0, len(book_ids), 500):
+        for statement in statements:
+            conn.execute(statement, {'book_ids': book_ids[start:start + 500]})
+
+@contextmanager
+def deferred_catalog_triggers(conn):
+    # For bulk writes inside conn's transaction: suspends the per-row search
+    # index and catalog-version triggers, so adding n authors to a book no
+    # longer re-indexes it n + 1 times. The caller adds every book id it
+    # writes to the yielded set; on exit each is re-indexed once and the
+    # catalog version is bumped once. A rollback discards the suspension too.
+    touched = set()
+    conn.execute(text("INSERT OR IGNORE INTO trigger_suspend (id) VALUES (1)"))
+    yield touched
+    conn.execute(delete(trigger_suspend))
+    if touched:
+        refresh_search_index(conn, touched)
+        conn.execute(text(
+            "UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1"
+        ))
+
+def rebuild_search_index(conn):
+    conn.execute(text("DELETE FROM book_fts"))
+    conn.execute(text(f"""
+        INSERT INTO book_fts (rowid, title, isbn, authors, genres, publisher)
+        {BOOK_FTS_DOCUMENT}
+    """))
+
+def build_fts_query(search_term):
+    # Quote every token so user input can't inject FTS5 syntax, and make each
+    # one a prefix match: "harry pot" -> "harry"* "pot"*
+    tokens = re.findall(r'\w+', search_term)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def get_search_limit():
+    limit = request.form.get('limit', type=int) or app.config['SEARCH_RESULT_LIMIT']
+    return max(1, min(limit, app.config['SEARCH_MAX_RESULT_LIMIT']))
+
+def search_all_branches(search_term, limit):
+    # bm25 scores are not comparable across indexes, so results are
+    # interleaved by rank: every branch's best match, then every second best...
+    results = fan_out(lambda conn: search_catalog(conn, search_term, limit))
+    ranked = [[dict(row._mapping, tenant=name) for row in rows] for name, rows in results.items()]
+    merged = [book for group in itertools.zip_longest(*ranked) for book in group if book is not None]
+    return merged[:limit]
+
+def search_catalog(conn, search_term, limit):
+    fts_query = build_fts_query(search_term)
+    if not fts_query:
+        return []
+    # bm25 weights: title, isbn, authors, genres, publisher
+    stmt = text("""
+        SELECT b.*
+        FROM book_fts
+        JOIN book b ON b.id = book_fts.rowid
+        WHERE book_fts MATCH :query
+        ORDER BY bm25(book_fts, 10.0, 5.0, 4.0, 2.0, 1.0)
+        LIMIT :limit
+    """)
+    try:
+        return conn.execute(stmt, {"query": fts_query, "limit": limit}).all()
+    except OperationalError:
+        # Search index not created yet (run `flask init-db`); fall back to LIKE
+        conn.rollback()
+        stmt = text("SELECT * FROM book WHERE title LIKE :search_term OR isbn LIKE :search_term LIMIT :limit")
+        return conn.execute(stmt, {"search_term": f"%{search_term}%", "limit": limit}).all()
+
+# Triggers keeping genre_book_counts/author_book_counts current. Each report
+# has an entity table (genre/author) and an association table feeding it.
+def _report_triggers(report, entity, assoc, summary, key):
+    touch = f"""
+        INSERT INTO report_status (name, updated_at) VALUES ('{report}', CURRENT_TIMESTAMP)
+        ON CONFLICT (name) DO UPDATE SET updated_at = excluded.updated_at;
+    """
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{entity}_report_insert AFTER INSERT ON {entity}
+        BEGIN
+            INSERT OR IGNORE INTO {summary} ({key}, book_count) VALUES (new.id, 0);
+            {touch}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{entity}_report_delete AFTER DELETE ON {entity}
+        BEGIN
+            DELETE FROM {summary} WHERE {key} = old.id;
+            {touch}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{assoc}_report_insert AFTER INSERT ON {assoc}
+        BEGIN
+            UPDATE {summary} SET book_count = book_count + 1 WHERE {key} = new.{key};
+            {touch}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{assoc}_report_delete AFTER DELETE ON {assoc}
+        BEGIN
+            UPDATE {summary} SET book_count = book_count - 1 WHERE {key} = old.{key};
+            {touch}
+        END
+        """,
+    ]
+
+REPORT_TRIGGERS = (
+    _report_triggers('books_by_genre', 'genre', 'book_genres', 'genre_book_counts', 'genre_id')
+    + _report_triggers('authors_by_books', 'author', 'book_authors', 'author_book_counts', 'author_id')
+)
+
+def rebuild_report_tables(conn):
+    conn.execute(text("DELETE FROM genre_book_counts"))
+    conn.execute(text("""
+        INSERT INTO genre_book_counts (genre_id, book_count)
+        SELECT g.id, (SELECT COUNT(*) FROM book_genres bg WHERE bg.genre_id = g.id)
+        FROM genre g
+    """))
+    conn.execute(text("DELETE FROM author_book_counts"))
+    conn.execute(text("""
+        INSERT INTO author_book_counts (author_id, book_count)
+        SELECT a.id, (SELECT COUNT(*) FROM book_authors ba WHERE ba.author_id = a.id)
+        FROM author a
+    """))
+    conn.execute(text("""
+        INSERT OR REPLACE INTO report_status (name, updated_at)
+        VALUES ('books_by_genre', CURRENT_TIMESTAMP), ('authors_by_books', CURRENT_TIMESTAMP)
+    """))
+
+def get_report_page_args():
+    # ?top=N returns the N largest rows; otherwise ?page=/&per_page= paginate
+    top = request.args.get('top', type=int)
+    if top:
+        return max(1, min(top, app.config['REPORT_MAX_PER_PAGE'])), 0, 1
+    per_page = request.args.get('per_page', type=int) or app.config['REPORT_PER_PAGE']
+    per_page = max(1, min(per_page, app.config['REPORT_MAX_PER_PAGE']))
+    page = max(1, request.args.get('page', 1, type=int))
+    return per_page, (page - 1) * per_page, page
+
+def get_report_as_of(conn, name):
+    return conn.execute(
+        select(report_status.c.updated_at).where(report_status.c.name == name)
+    ).scalar()
+
+CATALOG_VERSION_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_catalog_version_{action.lower()}
+    AFTER {action} ON {table} {UNLESS_SUSPENDED}
+    BEGIN
+        UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+    END
+    """
+    for table in ['book', 'author', 'genre', 'publisher', 'book_authors', 'book_genres']
+    for action in ['INSERT', 'UPDATE', 'DELETE']
+]
+
+def get_catalog_version(conn):
+    row = conn.execute(select(catalog_version).where(catalog_version.c.id == 1)).first()
+    if row is None:
+        seed_through(conn, lambda c: c.execute(text("""
+            INSERT OR IGNORE INTO catalog_version (id, version, updated_at)
+            VALUES (1, 0, CURRENT_TIMESTAMP)
+        """)))
+        row = conn.execute(select(catalog_version).where(catalog_version.c.id == 1)).first()
+    return row.version, row.updated_at
+
+def seed_through(conn, write):
+    # Writes a missing singleton row through conn itself, so the async views
+    # (calling in via run_sync) never block the event loop on another engine.
+    # Only a read-only connection falls back to the primary.
+    try:
+        write(conn)
+        conn.commit()
+    except OperationalError:
+        conn.rollback()
+        with db.engine.begin() as primary:
+            write(primary)
+        conn.commit()  # end the read transaction so the new row is visible
+
+def cached_page(view):
+    # Conditional GET and rendered-HTML caching for read-only list pages, keyed
+    # by endpoint, query arguments and the catalog version.
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with read_engine().connect() as conn:
+            version, updated_at = get_catalog_version(conn)
+
+        if session.get('_flashes'):
+            # Flash messages are one-shot; render them fresh and don't cache
+            return view(*args, **kwargs)
+
+        etag = catalog_etag(version)
+        if catalog_not_modified(etag, updated_at):
+            response = Response(status=304)
+        else:
+            key = tenant_key((request.endpoint, tuple(sorted(kwargs.items())),
+                              tuple(sorted(request.args.items(multi=True)))))
+            # Streamed pages can only be sent once, so they are never cached;
+            # views set g.skip_page_cache for pages that don't reflect version
+            response = make_response(page_cache.get(
+                key, lambda: view(*args, **kwargs), version=version,
+                should_store=lambda rv: not is_streamed(rv) and not g.get('skip_page_cache')))
+            if g.get('skip_page_cache'):
+                return response
+        return set_catalog_validators(response, etag, updated_at)
+    return wrapper
+
+def is_streamed(rv):
+    return isinstance(rv, Response) and rv.is_streamed
+
+def catalog_etag(version):
+    # Shared with the async views in asgi.py, so both serving modes validate alike
+    return f'{tenant_name(current_tenant())}-{request.endpoint}-{version}'
+
+def catalog_not_modified(etag, updated_at):
+    if request.if_none_match:
+        return etag in request.if_none_match
+    return bool(request.if_modified_since and
+                updated_at.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since)
+
+def set_catalog_validators(response, etag, updated_at):
+    response.set_etag(etag)
+    response.last_modified = updated_at.replace(tzinfo=timezone.utc)
+    response.cache_control.no_cache = True
+    return response
+
+def rebuild_catalog_stats(conn):
+    conn.execute(text("""
+        INSERT OR REPLACE INTO catalog_stats
+            (id, total_books, total_authors, total_genres, total_publishers)
+        VALUES (1,
+            (SELECT COUNT(*) FROM book),
+            (SELECT COUNT(*) FROM author),
+            (SELECT COUNT(*) FROM genre),
+            (SELECT COUNT(*) FROM publisher))
+    """))
+
+def get_catalog_stats(conn):
+    stats = conn.execute(select(catalog_stats).where(catalog_stats.c.id == 1)).first()
+    if stats is None:
+        # Counters not seeded yet (database predates catalog_stats); count once
+        # so the dashboard still renders
+        seed_through(conn, rebuild_catalog_stats)
+        stats = conn.execute(select(catalog_stats).where(catalog_stats.c.id == 1)).first()
+    return stats
+
+# Lookup list cache
+class LookupCache:
+    # Thread-safe LRU of loaded values with a TTL. Entries may carry a version
+    # tag; a lookup with a different version is treated as a miss.
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader, version=None, should_store=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires, entry_version = entry
+                if expires > now and entry_version == version:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        value = loader()
+        if should_store is not None and not should_store(value):
+            return value
+        with self._lock:
+            self._entries[key] = (value, now + self.ttl, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+lookup_cache = LookupCache(app.config['LOOKUP_CACHE_TTL'], app.config['LOOKUP_CACHE_MAX_ENTRIES'])
+# Rendered list pages keyed by (endpoint, arguments), tagged with the catalog version
+page_cache = LookupCache(app.config['PAGE_CACHE_TTL'], app.config['PAGE_CACHE_MAX_ENTRIES'])
+# Rendered book details pages keyed by book id, tagged with the book's versions
+details_cache = LookupCache(app.config['BOOK_DETAILS_CACHE_TTL'], app.config['BOOK_DETAILS_CACHE_MAX_ENTRIES'])
+
+LOOKUP_MODELS = {'author': Author, 'genre': Genre, 'publisher': Publisher}
+
+def get_cache_version(conn, name):
+    return conn.execute(
+        select(cache_versions.c.version).where(cache_versions.c.name == name)
+    ).scalar() or 0
+
+def bump_cache_version(conn, name):
+    conn.execute(text("""
+        INSERT INTO cache_versions (name, version) VALUES (:name, 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1
+    """), {"name": name})
+
+def get_lookup_list(name):
+    # (id, name) rows for a picker, without loading biography/description text
+    model = LOOKUP_MODELS[name]
+    version = None
+    if app.config['LOOKUP_CACHE_SHARED']:
+        with db.engine.connect() as conn:
+            version = get_cache_version(conn, f'lookup:{name}')
+
+    def load():
+        with db.engine.connect() as conn:
+            return conn.execute(select(model.id, model.name).order_by(model.name)).all()
+
+    return lookup_cache.get(tenant_key(name), load, version=version)
+
+class PrefixIndex:
+    # Sorted array of (casefolded key, id, name) for prefix lookups by bisect.
+    # Every word of a name is a key, so "aus" finds "Jane Austen" as well as
+    # "Austen Press".
+    def __init__(self, rows):
+        entries = []
+        for id, name in rows:
+            words = name.casefold().split()
+            for i in range(len(words)):
+                entries.append((' '.join(words[i:]), id, name))
+        entries.sort()
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+
+    def search(self, prefix, limit):
+        prefix = ' '.join(prefix.casefold().split())
+        if not prefix:
+            return []
+        results, seen = [], set()
+        for i in range(bisect.bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[i].startswith(prefix):
+                break
+            _, id, name = self.entries[i]
+            if id not in seen:
+                seen.add(id)
+                results.append({'id': id, 'name': name})
+                if len(results) == limit:
+                    break
+        return results
+
+def get_prefix_index(name):
+    # Built from the cached lookup list and stored alongside it, so the write
+    # routes' invalidate_lookup() keeps both current.
+    rows = get_lookup_list(name)
+    version = None
+    if app.config['LOOKUP_CACHE_SHARED']:
+        with db.engine.connect() as conn:
+            version = get_cache_version(conn, f'lookup:{name}')
+    return lookup_cache.get(tenant_key(('suggest', name)), lambda: PrefixIndex(rows), version=version)
+
+def get_book_versions(conn, book_id):
+    # (row version, name version) pair that identifies a rendering of a book's
+    # details: edits/deletes of the book bump the first, renames of authors,
+    # genres and publishers bump the second.
+    versions = dict(conn.execute(
+        select(cache_versions.c.name, cache_versions.c.version)
+        .where(cache_versions.c.name.in_([f'book:{book_id}', 'names']))
+    ).all())
+    return versions.get(f'book:{book_id}', 0), versions.get('names', 0)
+
+def invalidate_lookup(name):
+    lookup_cache.invalidate(tenant_key(name))
+    lookup_cache.invalidate(tenant_key(('suggest', name)))
+    if app.config['LOOKUP_CACHE_SHARED']:
+        with db.engine.begin() as conn:
+            bump_cache_version(conn, f'lookup:{name}')
+
+# Faceted filtering
+# The book list can be narrowed by genre, author, publisher, publication date
+# range and stock. Facet counts come from FacetIndex: one bitmap (a Python int,
+# bit n = book id n) per genre, per publisher, per top author and for in-stock
+# books, so a count is an AND plus a popcount instead of a GROUP BY scan.
+FACET_PARAMS = ('genre', 'author', 'publisher', 'published_from', 'published_to', 'in_stock')
+
+def get_book_filters():
+    filters = {}
+    for key in ('genre', 'author', 'publisher'):
+        value = request.args.get(key, type=int)
+        if value:
+            filters[key] = value
+    for key in ('published_from', 'published_to'):
+        value = request.args.get(key)
+        if value:
+            try:
+                filters[key] = datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                pass
+    if request.args.get('in_stock'):
+        filters['in_stock'] = True
+    return filters
+
+def book_filter_clauses(filters):
+    clauses = []
+    if 'genre' in filters:
+        clauses.append(Book.id.in_(
+            select(book_genres.c.book_id).where(book_genres.c.genre_id == filters['genre'])))
+    if 'author' in filters:
+        clauses.append(Book.id.in_(
+            select(book_authors.c.book_id).where(book_authors.c.author_id == filters['author'])))
+    if 'publisher' in filters:
+        clauses.append(Book.publisher_id == filters['publisher'])
+    if 'published_from' in filters:
+        clauses.append(Book.publication_date >= filters['published_from'])
+    if 'published_to' in filters:
+        clauses.append(Book.publication_date <= filters['published_to'])
+    if filters.get('in_stock'):
+        clauses.append(Book.copies_available > 0)
+    return clauses
+
+def ids_to_bitmap(ids):
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, 'little')
+
+def _group_bitmaps(rows):
+    groups = {}
+    for key, book_id in rows:
+        groups.setdefault(key, []).append(book_id)
+    return {key: ids_to_bitmap(ids) for key, ids in groups.items()}
+
+class FacetIndex:
+    # Bitmaps are rebuilt lazily when the catalog version has moved on, but
+    # at most once per FACET_INDEX_MAX_STALENESS seconds so a burst of writes
+    # (e.g. checkouts) doesn't trigger a rebuild per request. Callers never
+    # wait for a rebuild: the async views run this on the event loop thread,
+    # where blocking on a lock held by another request would deadlock. While
+    # one caller rebuilds, the others use the previous bitmaps (facets_stale).
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.built_at = 0.0
+        self.all_books = 0
+        self.in_stock = 0
+        self.genres = {}
+        self.publishers = {}
+        self.authors = {}
+        self.names = {'genre': {}, 'publisher': {}, 'author': {}}
+
+    def ensure_current(self, conn, version=None):
+        if version is None:
+            version, _ = get_catalog_version(conn)
+        fresh = time.monotonic() - self.built_at < app.config['FACET_INDEX_MAX_STALENESS']
+        if self.version == version or (self.version is not None and fresh):
+            return self
+        if not self._lock.acquire(blocking=False):
+            if self.version is None:
+                # Nothing to serve yet; build a private copy instead of waiting
+                self._build(conn, version)
+            return self
+        try:
+            if self.version != version:
+                self._build(conn, version)
+        finally:
+            self._lock.release()
+        return self
+
+    def _build(self, conn, version):
+        all_books = ids_to_bitmap(conn.execute(select(Book.id)).scalars())
+        in_stock = ids_to_bitmap(conn.execute(
+            select(Book.id).where(Book.copies_available > 0)).scalars())
+        genres = _group_bitmaps(conn.execute(
+            select(book_genres.c.genre_id, book_genres.c.book_id)))
+        publishers = _group_bitmaps(conn.execute(
+            select(Book.publisher_id, Book.id).where(Book.publisher_id.isnot(None))))
+        # Authors are too many to keep a bitmap each; keep the most prolific ones
+        top_authors = conn.execute(
+            select(author_book_counts.c.author_id)
+            .where(author_book_counts.c.book_count > 0)
+            .order_by(author_book_counts.c.book_count.desc())
+            .limit(app.config['FACET_TOP_AUTHORS'])
+        ).scalars().all()
+        authors = _group_bitmaps(conn.execute(
+            select(book_authors.c.author_id, book_authors.c.book_id)
+            .where(book_authors.c.author_id.in_(top_authors))))
+        names = {
+            'genre': dict(conn.execute(select(Genre.id, Genre.name)).all()),
+            'publisher': dict(conn.execute(select(Publisher.id, Publisher.name)).all()),
+            'author': dict(conn.execute(select(Author.id, Author.name).where(Author.id.in_(top_authors))).all()),
+        }
+        # The swap does no I/O, so it can't be interleaved with another
+        # request on the event loop; an older concurrent build never wins
+        if self.version is not None and self.version > version:
+            return
+        (self.all_books, self.in_stock, self.genres, self.publishers,
+         self.authors, self.names) = all_books, in_stock, genres, publishers, authors, names
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def filter_bitmap(self, conn, filters):
+        bitmap = self.all_books
+        if 'genre' in filters:
+            bitmap &= self.genres.get(filters['genre'], 0)
+        if 'publisher' in filters:
+            bitmap &= self.publishers.get(filters['publisher'], 0)
+        if 'author' in filters:
+            author_bitmap = self.authors.get(filters['author'])
+            if author_bitmap is None:
+                author_bitmap = ids_to_bitmap(conn.execute(
+                    select(book_authors.c.book_id)
+                    .where(book_authors.c.author_id == filters['author'])).scalars())
+            bitmap &= author_bitmap
+        if 'published_from' in filters or 'published_to' in filters:
+            # Range over ix_book_publication_date (covering: date + rowid)
+            stmt = select(Book.id).where(*book_filter_clauses({
+                k: v for k, v in filters.items() if k in ('published_from', 'published_to')}))
+            bitmap &= ids_to_bitmap(conn.execute(stmt).scalars())
+        if filters.get('in_stock'):
+            bitmap &= self.in_stock
+        return bitmap
+
+    def facet_counts(self, conn, filters):
+        bitmap = self.filter_bitmap(conn, filters)
+
+        def counts(kind, bitmaps):
+            names = self.names[kind]
+            values = [
+                {'id': key, 'name': names.get(key, f'#{key}'), 'count': (bitmaps[key] & bitmap).bit_count()}
+                for key in bitmaps
+            ]
+            values = [v for v in values if v['count'] or filters.get(kind) == v['id']]
+            return sorted(values, key=lambda v: (-v['count'], v['name']))
+
+        return {
+            'matching': bitmap.bit_count(),
+            'in_stock': (bitmap & self.in_stock).bit_count(),
+            'genres': counts('genre', self.genres),
+            'publishers': counts('publisher', self.publishers),
+            'authors': counts('author', self.authors),
+        }
+
+# One FacetIndex per tenant
+facet_indexes = {}
+_facet_indexes_lock = threading.Lock()
+
+def get_facet_index():
+    tenant = current_tenant()
+    with _facet_indexes_lock:
+        if tenant not in facet_indexes:
+            facet_indexes[tenant] = FacetIndex()
+        return facet_indexes[tenant]
+
+@app.template_global()
+def facet_url(filters, **changes):
+    # Book list URL with some facet parameters set (or cleared with None);
+    # changing a filter always starts again from the first page.
+    args = {**filters, **changes}
+    return url_for('index', **{key: value for key, value in args.items() if value not in (None, '')})
+
+# Keyset pagination helpers
+# Cursors are opaque url-safe tokens holding the (title, id) of a boundary row,
+# so a page is fetched with a range seek on ix_book_title instead of an OFFSET scan.
+def encode_cursor(title, book_id):
+    raw = json.dumps([title, book_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        title, book_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if not isinstance(title, str) or not isinstance(book_id, int):
+        return None
+    return title, book_id
+
+def get_page_size():
+    per_page = request.args.get('per_page', type=int) or app.config['BOOKS_PER_PAGE']
+    return max(1, min(per_page, app.config['BOOKS_MAX_PER_PAGE']))
+
+def fetch_book_page(conn, after=None, before=None, per_page=50, filters=None):
+    # Fetch one extra row to find out whether another page exists in the
+    # direction we are walking.
+    sort_key = tuple_(Book.title, Book.id)
+    stmt = select(Book.__table__, Publisher.name.label('publisher_name')).outerjoin(
+        Publisher, Book.publisher_id == Publisher.id
+    )
+    if filters:
+        stmt = stmt.where(*book_filter_clauses(filters))
+    if before is not None:
+        stmt = stmt.where(sort_key < tuple_(*before)).order_by(Book.title.desc(), Book.id.desc())
+    else:
+        if after is not None:
+            stmt = stmt.where(sort_key > tuple_(*after))
+        stmt = stmt.order_by(Book.title, Book.id)
+    rows = conn.execute(stmt.limit(per_page + 1)).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is not None:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after is not None, has_more
+
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(rows[-1].title, rows[-1].id)
+    if rows and has_prev:
+        prev_cursor = encode_cursor(rows[0].title, rows[0].id)
+    return rows, next_cursor, prev_cursor
+
+def load_book_list(conn, rows):
+    # Batched list loader: one query for the authors and one for the genres of
+    # the whole page, however many rows it has, instead of lazy per-row loads.
+    books = []
+    by_id = {}
+    for row in rows:
+        book = dict(row._mapping)
+        book['publisher'] = {'id': row.publisher_id, 'name': row.publisher_name} if row.publisher_name else None
+        book['authors'] = []
+        book['genres'] = []
+        books.append(book)
+        by_id[book['id']] = book
+    if not by_id:
+        return books
+
+    authors_stmt = (
+        select(book_authors.c.book_id, Author.id, Author.name)
+        .join(Author, Author.id == book_authors.c.author_id)
+        .where(book_authors.c.book_id.in_(list(by_id)))
+        .order_by(Author.name)
+    )
+    for book_id, author_id, name in conn.execute(authors_stmt):
+        by_id[book_id]['authors'].append({'id': author_id, 'name': name})
+
+    genres_stmt = (
+        select(book_genres.c.book_id, Genre.id, Genre.name)
+        .join(Genre, Genre.id == book_genres.c.genre_id)
+        .where(book_genres.c.book_id.in_(list(by_id)))
+        .order_by(Genre.name)
+    )
+    for book_id, genre_id, name in conn.execute(genres_stmt):
+        by_id[book_id]['genres'].append({'id': genre_id, 'name': name})
+    return books
+
+def sync_book_associations(conn, table, column, book_id, ids, current_ids=None):
+    # Diff the submitted ids against the stored ones and touch only the rows
+    # that changed: one multi-row DELETE and one multi-row INSERT at most.
+    target_col = table.c[column]
+    wanted = {int(i) for i in ids if i}
+    if current_ids is None:
+        current_ids = conn.execute(
+            select(target_col).where(table.c.book_id == book_id)
+        ).scalars()
+    current = set(current_ids)
+
+    removed = current - wanted
+    added = wanted - current
+    if removed:
+        conn.execute(delete(table).where(table.c.book_id == book_id, target_col.in_(removed)))
+    if added:
+        conn.execute(insert(table).values([
+            {'book_id': book_id, column: value} for value in sorted(added)
+        ]))
+    return added, removed
+
+def load_index_context(conn, after, before, per_page, filters=None):
+    filters = filters or {}
+    rows, next_cursor, prev_cursor = fetch_book_page(
+        conn, after=after, before=before, per_page=per_page, filters=filters
+    )
+    books = load_book_list(conn, rows)
+    stats = get_catalog_stats(conn)
+    version, _ = get_catalog_version(conn)
+    facet_index = get_facet_index().ensure_current(conn, version)
+    facets = facet_index.facet_counts(conn, filters)
+    conn.commit()
+    return dict(
         books=books,
-        total_books=total_books,
-        total_authors=total_authors,
-        total_genres=total_genres,
-        total_publishers=total_publishers,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+        per_page=per_page,
+        filters={key: value.isoformat() if hasattr(value, 'isoformat') else value
+                 for key, value in filters.items()},
+        facets=facets,
+        # Counts from an index still within FACET_INDEX_MAX_STALENESS of an
+        # older catalog version; such a page must not be cached or validated
+        # as the current version
+        facets_stale=facet_index.version != version,
+        total_books=stats.total_books,
+        total_authors=stats.total_authors,
+        total_genres=stats.total_genres,
+        total_publishers=stats.total_publishers,
         page_type='books'
     )
 
+# Streamed rendering
+# Pending flash messages force a normal render: the session cookie is sent
+# before a streamed body runs, so a flash consumed while streaming would
+# reappear on the next page.
+def should_stream(rows):
+    return rows >= app.config['STREAM_TEMPLATE_MIN_ROWS'] and not session.get('_flashes')
+
+def _buffer_chunks(chunks, size):
+    # Jinja yields many tiny fragments; send them in fewer, larger writes
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def render_streamed(template, **context):
+    return app.response_class(_buffer_chunks(stream_template(template, **context),
+                                             app.config['STREAM_TEMPLATE_CHUNK_SIZE']))
+
+def iter_rows(stmt):
+    # Rows fetched from the cursor in chunks; when the template is streamed the
+    # connection stays open only while the body is being generated
+    with read_engine().connect() as conn:
+        yield from conn.execution_options(yield_per=app.config['EXPORT_CHUNK_SIZE']).execute(stmt)
+
+def render_list(template, name, stmt, total):
+    if should_stream(total):
+        return render_streamed(template, **{name: iter_rows(stmt)})
+    return render_template(template, **{name: list(iter_rows(stmt))})
+
+# Routes
+@app.route('/')
+@cached_page
+def index():
+    per_page = get_page_size()
+    after = decode_cursor(request.args.get('after'))
+    before = None if after else decode_cursor(request.args.get('before'))
+
+    with read_engine().connect() as conn:
+        context = load_index_context(conn, after, before, per_page, get_book_filters())
+    g.skip_page_cache = context['facets_stale']
+
+    if should_stream(len(context['books'])):
+        return render_streamed('index.html', **context)
+    return render_template('index.html', **context)
+
 
 @app.route('/book/search', methods=['GET', 'POST'])
 def search_books():
     if request.method == 'POST':
         search_term = request.form['search_term']
+        limit = get_search_limit()
         
-        # Using prepared statement with parameter binding
-        stmt = text("SELECT * FROM book WHERE title LIKE :search_term OR isbn LIKE :search_term")
-        with db.engine.connect() as conn:
-            result = conn.execute(stmt, {"search_term": f"%{search_term}%"})
-            books = result.all()
+        if wants_all_branches(request.form):
+            books = search_all_branches(search_term, limit)
+            return render_template('search_results.html', books=books, search_term=search_term,
+                                   scope='all', tenant=tenant_name(current_tenant()))
+        
+        # Full-text search over the FTS5 index, ranked by bm25
+        with read_engine().connect() as conn:
+            books = search_catalog(conn, search_term, limit)
         
         return render_template('search_results.html', books=books, search_term=search_term)
     
@@ -168,7 +1471,7 @@ def new_book():
         # Handle publication date
         pub_date_str = request.form['publication_date']
         if pub_date_str:
-            pub_date = datetime.strptime(pub_date_str, '%Y-%m-%d')
+            pub_date = datetime.strptime(pub_date_str, '%Y-%m-%d').date()
         else:
             pub_date = None
             
@@ -185,27 +1488,16 @@ def new_book():
             ).returning(Book.id)
             
             with db.engine.connect() as conn:
-                with conn.begin():  # Start a transaction
+                with conn.begin(), deferred_catalog_triggers(conn) as touched:
                     result = conn.execute(stmt)
                     book_id = result.scalar_one()
+                    touched.add(book_id)
                     
-                    # Add authors using prepared statements
-                    author_ids = request.form.getlist('authors')
-                    for author_id in author_ids:
-                        author_stmt = insert(book_authors).values(
-                            book_id=book_id,
-                            author_id=author_id
-                        )
-                        conn.execute(author_stmt)
-                    
-                    # Add genres using prepared statements
-                    genre_ids = request.form.getlist('genres')
-                    for genre_id in genre_ids:
-                        genre_stmt = insert(book_genres).values(
-                            book_id=book_id,
-                            genre_id=genre_id
-                        )
-                        conn.execute(genre_stmt)
+                    # A new book has no associations yet, so everything is an insert
+                    sync_book_associations(conn, book_authors, 'author_id', book_id,
+                                           request.form.getlist('authors'), current_ids=())
+                    sync_book_associations(conn, book_genres, 'genre_id', book_id,
+                                           request.form.getlist('genres'), current_ids=())
             
             flash('Book added successfully!', 'success')
             return redirect(url_for('index'))
@@ -213,11 +1505,7 @@ def new_book():
             flash(f'Error adding book: {str(e)}', 'danger')
     
     # GET request - show form
-    publishers = Publisher.query.all()
-    authors = Author.query.all()
-    genres = Genre.query.all()
-    return render_template('book_form.html', publishers=publishers, 
-                          authors=authors, genres=genres, book=None)
+    return render_template('book_form.html', book=None)
 
 @app.route('/book/edit/<int:id>', methods=['GET', 'POST'])
 def edit_book(id):
@@ -233,50 +1521,43 @@ def edit_book(id):
             
             pub_date_str = request.form['publication_date']
             if pub_date_str:
-                pub_date = datetime.strptime(pub_date_str, '%Y-%m-%d')
+                pub_date = datetime.strptime(pub_date_str, '%Y-%m-%d').date()
             else:
                 pub_date = None
                 
             copies = int(request.form['copies_available'])
             
-            # Using prepared statement for update
+            # Only write the columns that actually changed
+            new_values = {
+                'title': title,
+                'isbn': isbn,
+                'publication_date': pub_date,
+                'copies_available': copies,
+                'publisher_id': int(publisher_id) if publisher_id else None
+            }
+            changes = {
+                column: value for column, value in new_values.items()
+                if getattr(book, column) != value
+            }
+            
             with db.engine.connect() as conn:
-                with conn.begin():  # Start a transaction
-                    # Update book
-                    update_stmt = update(Book).where(Book.id == id).values(
-                        title=title,
-                        isbn=isbn,
-                        publication_date=pub_date,
-                        copies_available=copies,
-                        publisher_id=publisher_id
-                    )
-                    conn.execute(update_stmt)
-                    
-                    # Delete existing author associations
-                    delete_authors_stmt = delete(book_authors).where(book_authors.c.book_id == id)
-                    conn.execute(delete_authors_stmt)
+                with conn.begin(), deferred_catalog_triggers(conn) as touched:
+                    if changes:
+                        update_stmt = update(Book).where(Book.id == id).values(**changes)
+                        conn.execute(update_stmt)
                     
-                    # Add new author associations
-                    author_ids = request.form.getlist('authors')
-                    for author_id in author_ids:
-                        author_stmt = insert(book_authors).values(
-                            book_id=id,
-                            author_id=author_id
-                        )
-                        conn.execute(author_stmt)
+                    # Apply only the added/removed associations
+                    # (the stored ids come from the already loaded relationships)
+                    author_diff = sync_book_associations(conn, book_authors, 'author_id', id,
+                                                         request.form.getlist('authors'),
+                                                         current_ids={a.id for a in book.authors})
+                    genre_diff = sync_book_associations(conn, book_genres, 'genre_id', id,
+                                                        request.form.getlist('genres'),
+                                                        current_ids={g.id for g in book.genres})
                     
-                    # Delete existing genre associations
-                    delete_genres_stmt = delete(book_genres).where(book_genres.c.book_id == id)
-                    conn.execute(delete_genres_stmt)
-                    
-                    # Add new genre associations
-                    genre_ids = request.form.getlist('genres')
-                    for genre_id in genre_ids:
-                        genre_stmt = insert(book_genres).values(
-                            book_id=id,
-                            genre_id=genre_id
-                        )
-                        conn.execute(genre_stmt)
+                    if changes or any(author_diff) or any(genre_diff):
+                        touched.add(id)
+                        bump_cache_version(conn, f'book:{id}')
             
             flash('Book updated successfully!', 'success')
             return redirect(url_for('index'))
@@ -284,11 +1565,9 @@ def edit_book(id):
             flash(f'Error updating book: {str(e)}', 'danger')
     
     # GET request - show form with book data
-    publishers = Publisher.query.all()
-    authors = Author.query.all()
-    genres = Genre.query.all()
-    return render_template('book_form.html', publishers=publishers, 
-                          authors=authors, genres=genres, book=book)
+    # Only the book's own authors/genres are rendered; the pickers fetch
+    # everything else from /api/suggest as the user types
+    return render_template('book_form.html', book=book)
 
 @app.route('/book/delete/<int:id>', methods=['POST'])
 def delete_book(id):
@@ -306,6 +1585,7 @@ def delete_book(id):
                 # Delete the book
                 delete_book_stmt = delete(Book).where(Book.id == id)
                 conn.execute(delete_book_stmt)
+                bump_cache_version(conn, f'book:{id}')
         
         flash('Book deleted successfully!', 'success')
     except Exception as e:
@@ -313,35 +1593,61 @@ def delete_book(id):
         
     return redirect(url_for('index'))
 
+# Authors and genres are aggregated in their own correlated subqueries,
+# so they never multiply into a cross product
+BOOK_DETAILS_STMT = text("""
+    SELECT bd.*,
+           (SELECT GROUP_CONCAT(a.name) FROM book_authors ba
+            JOIN author a ON a.id = ba.author_id
+            WHERE ba.book_id = bd.book_id) as authors,
+           (SELECT GROUP_CONCAT(g.name) FROM book_genres bg
+            JOIN genre g ON g.id = bg.genre_id
+            WHERE bg.book_id = bd.book_id) as genres
+    FROM vw_book_details bd
+    WHERE bd.book_id = :book_id
+""")
+
+def book_details_etag(book_id, versions):
+    return 'book-{}-{}-{}-{}'.format(tenant_name(current_tenant()), book_id, *versions)
+
 @app.route('/book/details/<int:id>')
 def book_details(id):
     # Use the stored procedure (view) to get book details
-    stmt = text("""
-        SELECT bd.*, 
-               GROUP_CONCAT(DISTINCT ba.author_name) as authors,
-               GROUP_CONCAT(DISTINCT bg.genre_name) as genres
-        FROM vw_book_details bd
-        LEFT JOIN vw_book_authors ba ON bd.book_id = ba.book_id
-        LEFT JOIN vw_book_genres bg ON bd.book_id = bg.book_id
-        WHERE bd.book_id = :book_id
-        GROUP BY bd.book_id
-    """)
-    
-    with db.engine.connect() as conn:
-        result = conn.execute(stmt, {"book_id": id})
-        book_details = result.fetchone()
+    with read_engine().connect() as conn:
+        versions = get_book_versions(conn, id)
+        etag = book_details_etag(id, versions)
+        if etag in request.if_none_match:
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
         
-    if not book_details:
+        def render():
+            book_details = conn.execute(BOOK_DETAILS_STMT, {"book_id": id}).fetchone()
+            if not book_details:
+                return None
+            return render_template('book_details.html', book=book_details)
+        
+        if session.get('_flashes'):
+            # Pending flash messages would be baked into the cached page
+            html = render()
+        else:
+            html = details_cache.get(tenant_key(id), render, version=versions)
+        
+    if html is None:
+        details_cache.invalidate(tenant_key(id))
         flash('Book not found', 'danger')
         return redirect(url_for('index'))
         
-    return render_template('book_details.html', book=book_details)
+    response = make_response(html)
+    response.set_etag(etag)
+    return response
 
-# Routes for supporting tables (keeping the ORM approach for these)
+# Routes for supporting tables. The list pages stream once the table has
+# STREAM_TEMPLATE_MIN_ROWS rows (counts come from catalog_stats).
 @app.route('/authors')
+@cached_page
 def list_authors():
-    authors = Author.query.all()
-    return render_template('authors.html', authors=authors)
+    with read_engine().connect() as conn:
+        total = get_catalog_stats(conn).total_authors
+    return render_list('authors.html', 'authors', select(Author.__table__), total)
 
 @app.route('/author/new', methods=['GET', 'POST'])
 def new_author():
@@ -356,6 +1662,7 @@ def new_author():
             with db.engine.connect() as conn:
                 with conn.begin():
                     conn.execute(stmt)
+            invalidate_lookup('author')
             flash('Author added successfully!', 'success')
             return redirect(url_for('list_authors'))
         except Exception as e:
@@ -382,6 +1689,8 @@ def edit_author(id):
             with db.engine.connect() as conn:
                 with conn.begin():
                     conn.execute(stmt)
+                    bump_cache_version(conn, 'names')
+            invalidate_lookup('author')
             flash('Author updated successfully!', 'success')
             return redirect(url_for('list_authors'))
         except Exception as e:
@@ -416,6 +1725,7 @@ def delete_author(id):
                 conn.execute(delete_stmt)
                 # The transaction will be committed automatically at the end of the with block
                 
+        invalidate_lookup('author')
         flash('Author deleted successfully!', 'success')
     except Exception as e:
         flash(f'Error deleting author: {str(e)}', 'danger')
@@ -423,9 +1733,11 @@ def delete_author(id):
     return redirect(url_for('list_authors'))
 
 @app.route('/publishers')
+@cached_page
 def list_publishers():
-    publishers = Publisher.query.all()
-    return render_template('publishers.html', publishers=publishers)
+    with read_engine().connect() as conn:
+        total = get_catalog_stats(conn).total_publishers
+    return render_list('publishers.html', 'publishers', select(Publisher.__table__), total)
 
 @app.route('/publisher/new', methods=['GET', 'POST'])
 def new_publisher():
@@ -445,6 +1757,7 @@ def new_publisher():
             with db.engine.connect() as conn:
                 with conn.begin():
                     conn.execute(stmt)
+            invalidate_lookup('publisher')
             flash('Publisher added successfully!', 'success')
             return redirect(url_for('list_publishers'))
         except Exception as e:
@@ -472,6 +1785,8 @@ def edit_publisher(id):
             with db.engine.connect() as conn:
                 with conn.begin():
                     conn.execute(stmt)
+                    bump_cache_version(conn, 'names')
+            invalidate_lookup('publisher')
             flash('Publisher updated successfully!', 'success')
             return redirect(url_for('list_publishers'))
         except Exception as e:
@@ -507,6 +1822,7 @@ def delete_publisher(id):
                 
                 # The transaction will be committed automatically at the end of the with block
                 
+        invalidate_lookup('publisher')
         flash('Publisher deleted successfully!', 'success')
     except Exception as e:
         flash(f'Error deleting publisher: {str(e)}', 'danger')
@@ -514,9 +1830,11 @@ def delete_publisher(id):
     return redirect(url_for('list_publishers'))
 
 @app.route('/genres')
+@cached_page
 def list_genres():
-    genres = Genre.query.all()
-    return render_template('genres.html', genres=genres)
+    with read_engine().connect() as conn:
+        total = get_catalog_stats(conn).total_genres
+    return render_list('genres.html', 'genres', select(Genre.__table__), total)
 
 @app.route('/genre/new', methods=['GET', 'POST'])
 def new_genre():
@@ -534,6 +1852,7 @@ def new_genre():
             with db.engine.connect() as conn:
                 with conn.begin():
                     conn.execute(stmt)
+            invalidate_lookup('genre')
             flash('Genre added successfully!', 'success')
             return redirect(url_for('list_genres'))
         except Exception as e:
@@ -559,6 +1878,8 @@ def edit_genre(id):
             with db.engine.connect() as conn:
                 with conn.begin():
                     conn.execute(stmt)
+                    bump_cache_version(conn, 'names')
+            invalidate_lookup('genre')
             flash('Genre updated successfully!', 'success')
             return redirect(url_for('list_genres'))
         except Exception as e:
@@ -589,54 +1910,1143 @@ def delete_genre(id):
             delete_stmt = delete(Genre).where(Genre.id == id)
             conn.execute(delete_stmt)
 
+        invalidate_lookup('genre')
         flash('Genre deleted successfully!', 'success')
     except Exception as e:
         flash(f'Error deleting genre: {str(e)}', 'danger')
         
     return redirect(url_for('list_genres'))
 
+# Pages of the maintained summary tables, largest counts first
+REPORT_STMTS = {
+    'books_by_genre': text("""
+        SELECT g.name as genre_name, s.book_count
+        FROM genre_book_counts s
+        JOIN genre g ON g.id = s.genre_id
+        ORDER BY s.book_count DESC, s.genre_id
+        LIMIT :limit OFFSET :offset
+    """),
+    'authors_by_books': text("""
+        SELECT a.name as author_name, s.book_count
+        FROM author_book_counts s
+        JOIN author a ON a.id = s.author_id
+        ORDER BY s.book_count DESC, s.author_id
+        LIMIT :limit OFFSET :offset
+    """),
+}
+
+def fetch_report_page(conn, report, limit, offset):
+    # One extra row tells the template whether there is a next page
+    rows = conn.execute(REPORT_STMTS[report], {"limit": limit + 1, "offset": offset}).all()
+    return rows, get_report_as_of(conn, report)
+
+REPORT_NAME_COLUMNS = {'books_by_genre': 'genre_name', 'authors_by_books': 'author_name'}
+
+def fetch_report_all_branches(report, limit, offset):
+    # Per-branch counts are summed by name (the same genre or author in two
+    # branches is one row); as_of is the oldest branch's refresh time
+    def load(conn):
+        return conn.execute(REPORT_STMTS[report], {"limit": -1, "offset": 0}).all(), get_report_as_of(conn, report)
+
+    totals = Counter()
+    as_ofs = []
+    for rows, as_of in fan_out(load).values():
+        for name, book_count in rows:
+            totals[name] += book_count
+        if as_of:
+            as_ofs.append(as_of)
+    ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[offset:offset + limit + 1]
+    name_column = REPORT_NAME_COLUMNS[report]
+    return [{name_column: name, 'book_count': count} for name, count in ranked], min(as_ofs, default=None)
+
+def load_report(report, limit, offset):
+    if wants_all_branches(request.args):
+        return fetch_report_all_branches(report, limit, offset)
+    with read_engine().connect() as conn:
+        return fetch_report_page(conn, report, limit, offset)
+
 # Using stored procedures (views)
 @app.route('/reports/books_by_genre')
 def books_by_genre():
-    stmt = text("""
-        SELECT g.name as genre_name, COUNT(bg.book_id) as book_count
-        FROM genre g
-        LEFT JOIN book_genres bg ON g.id = bg.genre_id
-        GROUP BY g.id, g.name
-        ORDER BY book_count DESC
-    """)
-    
-    with db.engine.connect() as conn:
-        result = conn.execute(stmt)
-        genre_stats = result.all()
-        
-    return render_template('report_books_by_genre.html', genre_stats=genre_stats)
+    limit, offset, page = get_report_page_args()
+    genre_stats, as_of = load_report('books_by_genre', limit, offset)
+    return render_template('report_books_by_genre.html', genre_stats=genre_stats[:limit],
+                           as_of=as_of, page=page, per_page=limit, scope=request.args.get('scope'),
+                           has_next=len(genre_stats) > limit and not request.args.get('top'))
 
 @app.route('/reports/authors_by_books')
 def authors_by_books():
-    stmt = text("""
-        SELECT a.name as author_name, COUNT(ba.book_id) as book_count
-        FROM author a
-        LEFT JOIN book_authors ba ON a.id = ba.author_id
-        GROUP BY a.id, a.name
-        ORDER BY book_count DESC
-    """)
-    
+    limit, offset, page = get_report_page_args()
+    author_stats, as_of = load_report('authors_by_books', limit, offset)
+    return render_template('report_authors_by_books.html', author_stats=author_stats[:limit],
+                           as_of=as_of, page=page, per_page=limit, scope=request.args.get('scope'),
+                           has_next=len(author_stats) > limit and not request.args.get('top'))
+
+# Streaming catalog export
+# Rows come from vw_book_details with the authors and genres aggregated in
+# correlated subqueries (no join fan-out), and are read in chunks so memory
+# stays flat however large the catalog is. The column layout matches the
+# import format, so an export can be fed straight back into import-books.
+EXPORT_COLUMNS = ['id', 'title', 'isbn', 'publication_date', 'copies_available',
+                  'publisher', 'authors', 'genres']
+
+EXPORT_STMT = text("""
+    SELECT
+        bd.book_id AS id,
+        bd.title,
+        bd.isbn,
+        bd.publication_date,
+        bd.copies_available,
+        bd.publisher_name AS publisher,
+        (SELECT group_concat(a.name, ';') FROM book_authors ba
+         JOIN author a ON a.id = ba.author_id WHERE ba.book_id = bd.book_id) AS authors,
+        (SELECT group_concat(g.name, ';') FROM book_genres bg
+         JOIN genre g ON g.id = bg.genre_id WHERE bg.book_id = bd.book_id) AS genres
+    FROM vw_book_details bd
+    ORDER BY bd.book_id
+""")
+
+def iter_export_rows(conn, chunk_size):
+    # The size goes to partitions() itself: without it SQLite results come
+    # back one row per partition, whatever yield_per says
+    result = conn.execution_options(yield_per=chunk_size).execute(EXPORT_STMT)
+    for partition in result.partitions(chunk_size):
+        yield partition
+
+def _export_date(value):
+    # Dates are stored as text by SQLite; trim any time part written by older rows
+    return value[:10] if value else ''
+
+def iter_export_csv(conn, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in iter_export_rows(conn, chunk_size):
+        for row in rows:
+            writer.writerow([row.id, row.title, row.isbn, _export_date(row.publication_date),
+                             row.copies_available, row.publisher or '', row.authors or '', row.genres or ''])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_export_jsonl(conn, chunk_size):
+    for rows in iter_export_rows(conn, chunk_size):
+        yield ''.join(
+            json.dumps({
+                'id': row.id,
+                'title': row.title,
+                'isbn': row.isbn,
+                'publication_date': _export_date(row.publication_date) or None,
+                'copies_available': row.copies_available,
+                'publisher': row.publisher,
+                'authors': row.authors.split(';') if row.authors else [],
+                'genres': row.genres.split(';') if row.genres else [],
+            }) + '\n'
+            for row in rows
+        )
+
+EXPORT_FORMATS = {
+    'csv': (iter_export_csv, 'text/csv'),
+    'jsonl': (iter_export_jsonl, 'application/x-ndjson'),
+}
+
+@app.route('/export/books.<fmt>')
+def export_books(fmt):
+    if fmt not in EXPORT_FORMATS:
+        return 'Unsupported export format', 404
+    writer, mimetype = EXPORT_FORMATS[fmt]
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+
+    def generate():
+        # The connection lives as long as the response is being streamed
+        with db.engine.connect() as conn:
+            yield from writer(conn, chunk_size)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=books.{fmt}'}
+    )
+
+# Performance instrumentation
+# Per-route latency histograms, per-route SQL statement counts/time, template
+# render time and pool gauges, rendered in Prometheus text format at /metrics.
+slow_query_log = logging.getLogger('bookmanager.slow_queries')
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.request_latency = {}   # (endpoint, method, status) -> Histogram
+        self.template_render = {}   # template name -> Histogram
+        self.sql_statements = {}    # endpoint -> statement count
+        self.sql_seconds = {}       # endpoint -> total statement time
+        self._lock = threading.Lock()
+
+    def _observe(self, histograms, key, value):
+        with self._lock:
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def observe_request(self, endpoint, method, status, seconds, sql_count, sql_seconds):
+        self._observe(self.request_latency, (endpoint, method, str(status)), seconds)
+        with self._lock:
+            self.sql_statements[endpoint] = self.sql_statements.get(endpoint, 0) + sql_count
+            self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + sql_seconds
+
+    def observe_template(self, name, seconds):
+        self._observe(self.template_render, name, seconds)
+
+    def render(self, pool):
+        lines = []
+
+        def labels(**values):
+            escaped = {k: str(v).replace('\\', '\\\\').replace('"', '\\"') for k, v in values.items()}
+            return ','.join(f'{k}="{v}"' for k, v in escaped.items())
+
+        def histogram(name, help_text, histograms, label_names):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for key, h in sorted(histograms.items()):
+                key = key if isinstance(key, tuple) else (key,)
+                base = labels(**dict(zip(label_names, key)))
+                for bound, count in zip(h.buckets, h.counts):
+                    lines.append(f'{name}_bucket{{{base},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{base},le="+Inf"}} {h.count}')
+                lines.append(f'{name}_sum{{{base}}} {h.sum:.6f}')
+                lines.append(f'{name}_count{{{base}}} {h.count}')
+
+        with self._lock:
+            histogram('bookmanager_request_duration_seconds', 'Request latency by route.',
+                      self.request_latency, ('endpoint', 'method', 'status'))
+            histogram('bookmanager_template_render_seconds', 'Template render time.',
+                      self.template_render, ('template',))
+            lines.append('# HELP bookmanager_sql_statements_total SQL statements issued, by route.')
+            lines.append('# TYPE bookmanager_sql_statements_total counter')
+            for endpoint, count in sorted(self.sql_statements.items()):
+                lines.append(f'bookmanager_sql_statements_total{{{labels(endpoint=endpoint)}}} {count}')
+            lines.append('# HELP bookmanager_sql_duration_seconds_total Time spent in SQL statements, by route.')
+            lines.append('# TYPE bookmanager_sql_duration_seconds_total counter')
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'bookmanager_sql_duration_seconds_total{{{labels(endpoint=endpoint)}}} {seconds:.6f}')
+
+        for name, help_text, value in [
+            ('bookmanager_db_pool_size', 'Configured connection pool size.', pool.size()),
+            ('bookmanager_db_pool_checked_out', 'Connections currently checked out.', pool.checkedout()),
+            ('bookmanager_db_pool_checked_in', 'Idle connections in the pool.', pool.checkedin()),
+            ('bookmanager_db_pool_overflow', 'Connections open beyond the pool size.', pool.overflow()),
+        ]:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics(app.config['METRICS_LATENCY_BUCKETS'])
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context rather than the connection: a statement
+    # that raises never reaches after_cursor_execute, so nothing is left behind
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_start', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if has_request_context():
+        g.sql_count = g.get('sql_count', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+    if elapsed * 1000 >= app.config['SLOW_QUERY_THRESHOLD_MS']:
+        _log_slow_query(cursor, statement, parameters, executemany, elapsed)
+
+def _log_slow_query(cursor, statement, parameters, executemany, elapsed):
+    plan = None
+    if (app.config['SLOW_QUERY_EXPLAIN'] and not executemany
+            and statement.lstrip().upper().startswith(('SELECT', 'WITH'))):
+        # Run on the raw DBAPI connection so the plan query isn't instrumented itself
+        try:
+            plan = [row[-1] for row in cursor.connection.execute(
+                'EXPLAIN QUERY PLAN ' + statement, parameters or ())]
+        except Exception as e:
+            plan = [f'unavailable: {e}']
+    slow_query_log.warning(
+        'Slow query (%.1f ms) on %s: %s | params=%r | plan=%s',
+        elapsed * 1000,
+        request.endpoint if has_request_context() else 'cli',
+        ' '.join(statement.split()),
+        f'<{len(parameters)} parameter sets>' if executemany else parameters,
+        '; '.join(plan) if plan else 'n/a'
+    )
+
+def _before_render_template(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('template_starts', []).append(time.perf_counter())
+
+def _template_rendered(sender, template, context, **extra):
+    if has_request_context() and g.get('template_starts'):
+        metrics.observe_template(template.name, time.perf_counter() - g.template_starts.pop())
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_seconds = 0.0
+
+@app.after_request
+def record_request_metrics(response):
+    if app.config['METRICS_ENABLED'] and 'request_start' in g:
+        metrics.observe_request(
+            request.endpoint or 'unknown', request.method, response.status_code,
+            time.perf_counter() - g.request_start, g.sql_count, g.sql_seconds
+        )
+    return response
+
+def instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+before_render_template.connect(_before_render_template, app)
+template_rendered.connect(_template_rendered, app)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(db.engine.pool), mimetype='text/plain; version=0.0.4')
+
+# Typeahead for the book form pickers
+@app.route('/api/suggest/<entity>')
+def suggest(entity):
+    if entity not in LOOKUP_MODELS:
+        return jsonify(error=f'Unknown entity: {entity}'), 404
+    limit = request.args.get('limit', type=int) or app.config['SUGGEST_LIMIT']
+    limit = max(1, min(limit, app.config['SUGGEST_MAX_LIMIT']))
+    return jsonify(data=get_prefix_index(entity).search(request.args.get('q', ''), limit))
+
+# JSON API
+# Endpoints built on Core row mappings (no ORM objects). Lists are
+# keyset-paginated on id, ?fields= projects columns, and ?ids=1,2,3 fetches a
+# batch of rows in one query. Inventory changes go through checkout/return.
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Resource name -> (table, selectable columns, expandable relations)
+API_RESOURCES = {
+    'books': (Book.__table__, ['id', 'title', 'isbn', 'publication_date', 'copies_available', 'publisher_id'],
+              ['authors', 'genres']),
+    'authors': (Author.__table__, ['id', 'name', 'biography'], []),
+    'genres': (Genre.__table__, ['id', 'name', 'description'], []),
+    'publishers': (Publisher.__table__, ['id', 'name', 'address', 'contact'], []),
+}
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+@api.errorhandler(ApiError)
+def handle_api_error(e):
+    return jsonify(error=e.message), e.status
+
+def _parse_api_fields(resource):
+    _, columns, relations = API_RESOURCES[resource]
+    requested = request.args.get('fields')
+    if not requested:
+        return columns, []
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in columns and f not in relations]
+    if unknown:
+        raise ApiError(f"Unknown field(s) for {resource}: {', '.join(unknown)}")
+    selected = [f for f in fields if f in columns]
+    if 'id' not in selected:
+        # Always fetched: keys the batched relation lookups and the cursor
+        selected.insert(0, 'id')
+    return selected, [f for f in fields if f in relations]
+
+def _parse_api_ids():
+    try:
+        ids = [int(i) for i in request.args['ids'].split(',') if i.strip()]
+    except ValueError:
+        raise ApiError('ids must be a comma-separated list of integers')
+    if len(ids) > app.config['API_MAX_PER_PAGE']:
+        raise ApiError(f"At most {app.config['API_MAX_PER_PAGE']} ids per request")
+    return ids
+
+def _serialize_row(mapping):
+    return {key: value.isoformat() if hasattr(value, 'isoformat') else value
+            for key, value in mapping.items()}
+
+def _expand_book_relations(conn, items, relations):
+    by_id = {item['id']: item for item in items}
+    if not by_id:
+        return
+    for relation in relations:
+        assoc, model, key = {
+            'authors': (book_authors, Author, 'author_id'),
+            'genres': (book_genres, Genre, 'genre_id'),
+        }[relation]
+        for item in items:
+            item[relation] = []
+        stmt = (
+            select(assoc.c.book_id, model.id, model.name)
+            .join(model, model.id == assoc.c[key])
+            .where(assoc.c.book_id.in_(list(by_id)))
+            .order_by(model.name)
+        )
+        for book_id, related_id, name in conn.execute(stmt):
+            by_id[book_id][relation].append({'id': related_id, 'name': name})
+
+def _query_api_resource(resource, ids=None, after_id=None, limit=None):
+    table = API_RESOURCES[resource][0]
+    fields, relations = _parse_api_fields(resource)
+    stmt = select(*[table.c[f] for f in fields])
+    if ids is not None:
+        stmt = stmt.where(table.c.id.in_(ids))
+    else:
+        if after_id is not None:
+            stmt = stmt.where(table.c.id > after_id)
+        stmt = stmt.limit(limit)
+    stmt = stmt.order_by(table.c.id)
+
     with db.engine.connect() as conn:
-        result = conn.execute(stmt)
-        author_stats = result.all()
-        
-    return render_template('report_authors_by_books.html', author_stats=author_stats)
+        items = [_serialize_row(row) for row in conn.execute(stmt).mappings()]
+        if relations:
+            _expand_book_relations(conn, items, relations)
+    return items
+
+@api.route('/<resource>')
+def api_list(resource):
+    if resource not in API_RESOURCES:
+        raise ApiError(f'Unknown resource: {resource}', 404)
+    if 'ids' in request.args:
+        return jsonify(data=_query_api_resource(resource, ids=_parse_api_ids()))
+
+    limit = request.args.get('limit', type=int) or app.config['API_PER_PAGE']
+    limit = max(1, min(limit, app.config['API_MAX_PER_PAGE']))
+    after_id = request.args.get('after_id', type=int)
+    items = _query_api_resource(resource, after_id=after_id, limit=limit)
+
+    next_url = None
+    if len(items) == limit:
+        args = request.args.to_dict()
+        args.update(after_id=items[-1]['id'])
+        next_url = url_for('api.api_list', resource=resource, **args)
+    return jsonify(data=items, next=next_url)
+
+@api.route('/<resource>/<int:id>')
+def api_detail(resource, id):
+    if resource not in API_RESOURCES:
+        raise ApiError(f'Unknown resource: {resource}', 404)
+    items = _query_api_resource(resource, ids=[id])
+    if not items:
+        raise ApiError(f'{resource[:-1].capitalize()} {id} not found', 404)
+    return jsonify(data=items[0])
+
+# Inventory
+# Stock is only ever changed relatively, with a guarded UPDATE, so concurrent
+# desks can't overwrite each other's counts. A multi-book checkout is one
+# transaction: either every copy is taken or none is.
+class InventoryError(ApiError):
+    # unavailable: books without enough copies; missing: ids with no book
+    def __init__(self, message, unavailable, missing=(), status=409):
+        super().__init__(message, status)
+        self.unavailable = unavailable
+        self.missing = list(missing)
+
+@api.errorhandler(InventoryError)
+def handle_inventory_error(e):
+    return jsonify(error=e.message, unavailable=e.unavailable, missing=e.missing), e.status
+
+def utcnow():
+    # Naive UTC, matching SQLite's CURRENT_TIMESTAMP
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def checkout_books(conn, book_ids, borrower=None):
+    wanted = {}
+    for book_id in book_ids:
+        wanted[book_id] = wanted.get(book_id, 0) + 1
+
+    # One guarded UPDATE for the whole batch; RETURNING tells us which books
+    # had enough copies
+    copies = case(wanted, value=Book.id)
+    taken = set(conn.execute(
+        update(Book)
+        .where(Book.id.in_(list(wanted)), Book.copies_available >= copies)
+        .values(copies_available=Book.copies_available - copies)
+        .returning(Book.id)
+    ).scalars())
+    if len(taken) != len(wanted):
+        # Raising rolls back the copies taken for the other books
+        failed = set(wanted) - taken
+        found = set(conn.execute(select(Book.id).where(Book.id.in_(failed))).scalars())
+        if found != failed:
+            raise InventoryError('Books not found', sorted(found), missing=sorted(failed - found), status=404)
+        raise InventoryError('Not enough copies available', sorted(failed))
+
+    now = utcnow()
+    loans = conn.execute(
+        insert(Loan).returning(Loan.id, Loan.book_id, sort_by_parameter_order=True),
+        [{'book_id': book_id, 'borrower': borrower, 'checked_out_at': now} for book_id in book_ids]
+    ).all()
+    for book_id in wanted:
+        bump_cache_version(conn, f'book:{book_id}')
+    return loans
+
+def return_loans(conn, loan_ids):
+    returned = conn.execute(
+        update(Loan)
+        .where(Loan.id.in_(loan_ids), Loan.returned_at.is_(None))
+        .values(returned_at=utcnow())
+        .returning(Loan.id, Loan.book_id)
+    ).all()
+    restock = {}
+    for _, book_id in returned:
+        restock[book_id] = restock.get(book_id, 0) + 1
+    if restock:
+        copies = case(restock, value=Book.id)
+        conn.execute(
+            update(Book)
+            .where(Book.id.in_(list(restock)))
+            .values(copies_available=Book.copies_available + copies)
+        )
+        for book_id in restock:
+            bump_cache_version(conn, f'book:{book_id}')
+    return returned
+
+def _json_id_list(payload, key):
+    ids = payload.get(key)
+    # bool is an int subclass; JSON true/false are not ids
+    if not isinstance(ids, list) or not ids or not all(type(i) is int for i in ids):
+        raise ApiError(f'{key} must be a non-empty list of integers')
+    if len(ids) > app.config['API_MAX_PER_PAGE']:
+        raise ApiError(f"At most {app.config['API_MAX_PER_PAGE']} ids per request")
+    return ids
+
+@api.route('/checkout', methods=['POST'])
+def api_checkout():
+    payload = request.get_json(silent=True) or {}
+    book_ids = _json_id_list(payload, 'book_ids')
+    with db.engine.begin() as conn:
+        loans = checkout_books(conn, book_ids, payload.get('borrower'))
+    return jsonify(loans=[{'id': loan.id, 'book_id': loan.book_id} for loan in loans]), 201
+
+@api.route('/return', methods=['POST'])
+def api_return():
+    payload = request.get_json(silent=True) or {}
+    loan_ids = _json_id_list(payload, 'loan_ids')
+    with db.engine.begin() as conn:
+        returned = return_loans(conn, loan_ids)
+    return jsonify(returned=[{'id': loan.id, 'book_id': loan.book_id} for loan in returned])
+
+@api.route('/books/available')
+def api_available_books():
+    # Walks ix_book_copies_available backwards: most copies first, keyset on
+    # (copies_available, id) so pages never need a sort or an OFFSET scan.
+    limit = request.args.get('limit', type=int) or app.config['API_PER_PAGE']
+    limit = max(1, min(limit, app.config['API_MAX_PER_PAGE']))
+    stmt = (
+        select(Book.id, Book.title, Book.isbn, Book.copies_available)
+        .where(Book.copies_available > 0)
+        .order_by(Book.copies_available.desc(), Book.id.desc())
+        .limit(limit)
+    )
+    after_copies = request.args.get('after_copies', type=int)
+    after_id = request.args.get('after_id', type=int)
+    if after_copies is not None and after_id is not None:
+        stmt = stmt.where(tuple_(Book.copies_available, Book.id) < tuple_(after_copies, after_id))
+
+    with db.engine.connect() as conn:
+        items = [dict(row) for row in conn.execute(stmt).mappings()]
+
+    next_url = None
+    if len(items) == limit:
+        next_url = url_for('api.api_available_books', limit=limit,
+                           after_copies=items[-1]['copies_available'], after_id=items[-1]['id'])
+    return jsonify(data=items, next=next_url)
+
+# Bulk catalog import
+# Records are streamed from CSV or JSONL and written in batched transactions.
+# CSV columns: title, isbn, publication_date, copies_available, publisher,
+# authors, genres (authors/genres separated by ';'). JSONL records use the same
+# keys, with authors/genres given either as lists or ';'-separated strings.
+def iter_import_records(path, fmt):
+    with open(path, newline='', encoding='utf-8') as fh:
+        if fmt == 'csv':
+            yield from csv.DictReader(fh)
+        else:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+def _split_names(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(';')
+    return [name.strip() for name in value if name and name.strip()]
+
+class NameLookup:
+    # In-memory name -> id cache for one lookup table, creating missing rows on demand
+    def __init__(self, conn, model):
+        self.model = model
+        self.ids = {name: id for id, name in conn.execute(select(model.id, model.name))}
+
+    def resolve(self, conn, names):
+        missing = [name for name in dict.fromkeys(names) if name not in self.ids]
+        if missing:
+            rows = conn.execute(
+                insert(self.model).returning(self.model.id, self.model.name, sort_by_parameter_order=True),
+                [{'name': name} for name in missing]
+            )
+            self.ids.update({name: id for id, name in rows})
+        return [self.ids[name] for name in names]
+
+def _required_text(record, key):
+    # A short CSV row yields None for the missing columns
+    value = record.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f'missing {key}')
+    return value.strip()
+
+def _parse_import_record(record):
+    # Raises ValueError for a record that can't be imported
+    if not isinstance(record, dict):
+        raise ValueError('not an object')
+    pub_date_str = (record.get('publication_date') or '').strip()
+    copies = record.get('copies_available')
+    return {
+        'title': _required_text(record, 'title'),
+        'isbn': _required_text(record, 'isbn'),
+        'publication_date': datetime.strptime(pub_date_str, '%Y-%m-%d').date() if pub_date_str else None,
+        'copies_available': int(copies) if copies not in (None, '') else 1,
+        'publisher': (record.get('publisher') or '').strip() or None,
+        'authors': _split_names(record.get('authors')),
+        'genres': _split_names(record.get('genres')),
+    }
+
+def import_batch(conn, batch, lookups, touched):
+    # Skip ISBNs that are already in the catalog (or repeated within the batch)
+    # so that re-running an import after a failure is idempotent.
+    # The ids of the inserted books are added to touched for re-indexing.
+    existing = set(conn.execute(
+        select(Book.isbn).where(Book.isbn.in_([r['isbn'] for r in batch]))
+    ).scalars())
+    records = []
+    for record in batch:
+        if record['isbn'] not in existing:
+            existing.add(record['isbn'])
+            records.append(record)
+    if not records:
+        return 0
+
+    publisher_ids = lookups['publisher'].resolve(conn, [r['publisher'] for r in records if r['publisher']])
+    publisher_by_name = dict(zip([r['publisher'] for r in records if r['publisher']], publisher_ids))
+    author_ids = lookups['author'].resolve(conn, [name for r in records for name in r['authors']])
+    genre_ids = lookups['genre'].resolve(conn, [name for r in records for name in r['genres']])
+
+    book_ids = conn.execute(
+        insert(Book).returning(Book.id, sort_by_parameter_order=True),
+        [{
+            'title': r['title'],
+            'isbn': r['isbn'],
+            'publication_date': r['publication_date'],
+            'copies_available': r['copies_available'],
+            'publisher_id': publisher_by_name.get(r['publisher']),
+        } for r in records]
+    ).scalars().all()
+    touched.update(book_ids)
+
+    author_iter = iter(author_ids)
+    genre_iter = iter(genre_ids)
+    author_rows = []
+    genre_rows = []
+    for book_id, record in zip(book_ids, records):
+        for author_id in dict.fromkeys(next(author_iter) for _ in record['authors']):
+            author_rows.append({'book_id': book_id, 'author_id': author_id})
+        for genre_id in dict.fromkeys(next(genre_iter) for _ in record['genres']):
+            genre_rows.append({'book_id': book_id, 'genre_id': genre_id})
+    if author_rows:
+        conn.execute(insert(book_authors), author_rows)
+    if genre_rows:
+        conn.execute(insert(book_genres), genre_rows)
+    return len(records)
+
+def _read_checkpoint(path, source):
+    # (records_done, rejected) from a checkpoint left by an import of the same
+    # source file; a checkpoint for any other file is ignored
+    try:
+        with open(path, encoding='utf-8') as fh:
+            state = json.load(fh)
+    except FileNotFoundError:
+        return 0, 0
+    if state.get('source') != os.path.abspath(source):
+        return 0, 0
+    return state.get('records_done', 0), state.get('rejected', 0)
+
+def _write_checkpoint(path, source, records_done, rejected):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump({'source': os.path.abspath(source), 'records_done': records_done,
+                   'rejected': rejected}, fh)
+    os.replace(tmp_path, path)
+
+def import_books_file(path, fmt=None, batch_size=None, checkpoint=None, resume=True, progress=None):
+    # Shared by the import-books command and the import_books job. progress is
+    # called after every committed batch with (records_done, imported, elapsed).
+    # Records that fail to parse are logged and counted as rejected; returns
+    # (imported, rejected, elapsed).
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv')
+    batch_size = batch_size or app.config['IMPORT_BATCH_SIZE']
+    checkpoint = checkpoint or path + '.checkpoint'
+    skip, rejected = _read_checkpoint(checkpoint, path) if resume else (0, 0)
+
+    with db.engine.connect() as conn:
+        lookups = {
+            'publisher': NameLookup(conn, Publisher),
+            'author': NameLookup(conn, Author),
+            'genre': NameLookup(conn, Genre),
+        }
+        conn.commit()
+
+        started = time.perf_counter()
+        records_done = skip
+        imported = 0
+        batch = []
+
+        def flush():
+            nonlocal imported
+            try:
+                with conn.begin(), deferred_catalog_triggers(conn) as touched:
+                    imported += import_batch(conn, batch, lookups, touched)
+            except Exception:
+                # The lookup caches may now hold ids from the rolled-back batch
+                for table, model in (('publisher', Publisher), ('author', Author), ('genre', Genre)):
+                    lookups[table] = NameLookup(conn, model)
+                conn.rollback()
+                raise
+            _write_checkpoint(checkpoint, path, records_done, rejected)
+            if progress:
+                progress(records_done, imported, time.perf_counter() - started)
+            batch.clear()
+
+        for index, record in enumerate(iter_import_records(path, fmt)):
+            if index < skip:
+                continue
+            records_done = index + 1
+            try:
+                batch.append(_parse_import_record(record))
+            except (TypeError, ValueError) as e:
+                app.logger.warning('Rejected import record #%s: %s', index + 1, e)
+                rejected += 1
+                continue
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    for name in LOOKUP_MODELS:
+        invalidate_lookup(name)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return imported, rejected, time.perf_counter() - started
+
+@app.cli.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Input format (defaults to the file extension).')
+@click.option('--batch-size', type=int, default=None, help='Records per transaction.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), default=None,
+              help='Checkpoint file (defaults to PATH.checkpoint).')
+@click.option('--resume/--no-resume', default=True,
+              help='Continue from the checkpoint left by a failed import.')
+def import_books_command(path, fmt, batch_size, checkpoint, resume):
+    skip, _ = _read_checkpoint(checkpoint or path + '.checkpoint', path) if resume else (0, 0)
+    if skip:
+        print(f'Resuming after {skip} records from {checkpoint or path + ".checkpoint"}')
+
+    def report(records_done, imported, elapsed):
+        print(f'{records_done} records read, {imported} books imported '
+              f'({imported / elapsed if elapsed else 0:.0f} books/s)')
+
+    try:
+        imported, rejected, elapsed = import_books_file(path, fmt, batch_size, checkpoint, resume, progress=report)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f'Import finished: {imported} books in {elapsed:.1f}s '
+          f'({imported / elapsed if elapsed else 0:.0f} books/s)')
+    if rejected:
+        print(f'{rejected} invalid records rejected')
+
+@app.cli.command('export-books')
+@click.argument('output', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv')
+def export_books_command(output, fmt):
+    writer, _ = EXPORT_FORMATS[fmt]
+    with db.engine.connect() as conn:
+        for chunk in writer(conn, app.config['EXPORT_CHUNK_SIZE']):
+            output.write(chunk)
+
+# Background jobs
+# Heavy maintenance and imports are queued in the job table and run by
+# `flask run-jobs`, a pool of worker processes. Workers claim jobs with a single
+# UPDATE ... RETURNING, so any number of them can share the queue. A job that
+# raises is retried with exponential backoff until max_attempts; a worker that
+# dies mid-job stops heartbeating and its job is re-queued after
+# JOB_LEASE_TIMEOUT. While a handler runs, a heartbeat thread renews the lease
+# every JOB_HEARTBEAT_INTERVAL, so handlers that never report progress (VACUUM,
+# the rebuilds) are not taken over by another worker. Handlers take (params, progress) and report progress with
+# progress(done, total=None, message=None).
+def _run_import_job(params, progress):
+    def report(records_done, imported, elapsed):
+        progress(records_done, message=f'{imported} books imported')
+    imported, rejected, elapsed = import_books_file(params['path'], params.get('format'),
+                                                    params.get('batch_size'), progress=report)
+    return f'{imported} books imported, {rejected} rejected in {elapsed:.1f}s'
+
+def _run_in_transaction(rebuild):
+    def handler(params, progress):
+        with db.engine.begin() as conn:
+            rebuild(conn)
+    return handler
+
+def _run_maintenance(statement):
+    # VACUUM cannot run inside a transaction
+    def handler(params, progress):
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.exec_driver_sql(statement)
+    return handler
+
+JOB_HANDLERS = {
+    'import_books': _run_import_job,
+    'rebuild_search_index': _run_in_transaction(rebuild_search_index),
+    'rebuild_reports': _run_in_transaction(rebuild_report_tables),
+    'rebuild_stats': _run_in_transaction(rebuild_catalog_stats),
+    'vacuum': _run_maintenance('VACUUM'),
+    'analyze': _run_maintenance('ANALYZE'),
+}
+
+def enqueue_job(conn, kind, params=None, max_attempts=None):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    # The queue lives in the default database; a job records the branch it
+    # was queued from and runs against that branch's shard
+    params = {key: value for key, value in (params or {}).items() if key != 'tenant'}
+    if current_tenant() is not None:
+        params['tenant'] = current_tenant()
+    now = utcnow()
+    return conn.execute(
+        insert(Job).returning(Job.id),
+        {'kind': kind, 'params': json.dumps(params), 'status': 'queued', 'attempts': 0,
+         'max_attempts': max_attempts or app.config['JOB_MAX_ATTEMPTS'],
+         'created_at': now, 'run_after': now}
+    ).scalar_one()
+
+def claim_job(conn, worker):
+    # Oldest runnable job: queued and due, or running with an expired lease
+    now = utcnow()
+    lease_expired = now - timedelta(seconds=app.config['JOB_LEASE_TIMEOUT'])
+    candidate = (
+        select(Job.id)
+        .where(((Job.status == 'queued') & (Job.run_after <= now)) |
+               ((Job.status == 'running') & (Job.heartbeat_at < lease_expired)))
+        .order_by(Job.run_after, Job.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    return conn.execute(
+        update(Job)
+        .where(Job.id == candidate)
+        .values(status='running', worker=worker, attempts=Job.attempts + 1,
+                started_at=now, heartbeat_at=now, error=None)
+        .returning(Job.id, Job.kind, Job.params, Job.attempts, Job.max_attempts)
+    ).first()
+
+def _job_progress(job_id, worker):
+    def progress(done, total=None, message=None):
+        with default_engine().begin() as conn:
+            conn.execute(
+                update(Job).where(Job.id == job_id, Job.worker == worker)
+                .values(progress_done=done, progress_total=total, message=message, heartbeat_at=utcnow())
+            )
+    return progress
+
+def _heartbeat(job_id, worker, stop):
+    with app.app_context():
+        while not stop.wait(app.config['JOB_HEARTBEAT_INTERVAL']):
+            try:
+                with default_engine().begin() as conn:
+                    conn.execute(update(Job).where(Job.id == job_id, Job.worker == worker)
+                                 .values(heartbeat_at=utcnow()))
+            except OperationalError as e:
+                # e.g. the database is locked by the job itself; retry next beat
+                app.logger.warning('Heartbeat for job %s failed: %s', job_id, e)
+
+def run_job(job, worker):
+    params = json.loads(job.params)
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job.id, worker, stop), daemon=True)
+    heartbeat.start()
+    try:
+        # Jobs run against the branch they were queued for
+        with use_tenant(params.get('tenant')):
+            result = JOB_HANDLERS[job.kind](params, _job_progress(job.id, worker))
+    except Exception as e:
+        values = {'error': f'{type(e).__name__}: {e}', 'heartbeat_at': None}
+        if job.attempts < job.max_attempts:
+            delay = app.config['JOB_RETRY_DELAY'] * 2 ** (job.attempts - 1)
+            values.update(status='queued', run_after=utcnow() + timedelta(seconds=delay))
+        else:
+            values.update(status='failed', finished_at=utcnow())
+        app.logger.warning('Job %s (%s) attempt %s failed: %s', job.id, job.kind, job.attempts, e)
+    else:
+        values = {'status': 'succeeded', 'finished_at': utcnow(), 'heartbeat_at': None}
+        if result is not None:
+            values['message'] = result
+    finally:
+        stop.set()
+        heartbeat.join()
+    with default_engine().begin() as conn:
+        conn.execute(update(Job).where(Job.id == job.id, Job.worker == worker).values(**values))
+
+def job_worker_loop(worker, drain=False):
+    with app.app_context():
+        # Connections inherited from the parent process must not be reused
+        default_engine().dispose(close=False)
+        shard_engines.dispose_all(close=False)
+        while True:
+            with default_engine().begin() as conn:
+                job = claim_job(conn, worker)
+            if job is not None:
+                run_job(job, worker)
+            elif drain:
+                return
+            else:
+                time.sleep(app.config['JOB_POLL_INTERVAL'])
+
+def _serialize_job(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'params': json.loads(job.params),
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'progress': {'done': job.progress_done, 'total': job.progress_total},
+        'message': job.message,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+@api.route('/jobs', methods=['POST'])
+def api_enqueue_job():
+    payload = request.get_json(silent=True) or {}
+    kind = payload.get('kind')
+    params = payload.get('params') or {}
+    if kind not in JOB_HANDLERS:
+        raise ApiError(f"kind must be one of: {', '.join(JOB_HANDLERS)}")
+    if not isinstance(params, dict):
+        raise ApiError('params must be an object')
+    if kind == 'import_books':
+        # Only files dropped into JOB_IMPORT_DIR can be imported over HTTP
+        import_dir = app.config['JOB_IMPORT_DIR'] or os.path.join(app.instance_path, 'imports')
+        path = os.path.realpath(os.path.join(import_dir, str(params.get('path', ''))))
+        if os.path.commonpath([path, os.path.realpath(import_dir)]) != os.path.realpath(import_dir) \
+                or not os.path.isfile(path):
+            raise ApiError(f'path must name a file in {import_dir}')
+        params['path'] = path
+    with default_engine().begin() as conn:
+        job_id = enqueue_job(conn, kind, params)
+    return jsonify(id=job_id, url=url_for('api.api_job', id=job_id)), 202
+
+@api.route('/jobs')
+def api_jobs():
+    limit = request.args.get('limit', type=int) or app.config['API_PER_PAGE']
+    limit = max(1, min(limit, app.config['API_MAX_PER_PAGE']))
+    stmt = select(Job.__table__).order_by(Job.id.desc()).limit(limit)
+    if request.args.get('status'):
+        stmt = stmt.where(Job.status == request.args['status'])
+    # Each branch only sees its own jobs
+    stmt = stmt.where(func.coalesce(func.json_extract(Job.params, '$.tenant'), '') == (current_tenant() or ''))
+    with default_engine().connect() as conn:
+        return jsonify(data=[_serialize_job(job) for job in conn.execute(stmt)])
+
+@api.route('/jobs/<int:id>')
+def api_job(id):
+    with default_engine().connect() as conn:
+        job = conn.execute(select(Job.__table__).where(Job.id == id)).first()
+    if job is None or json.loads(job.params).get('tenant') != current_tenant():
+        raise ApiError(f'job {id} not found', 404)
+    return jsonify(_serialize_job(job))
+
+@app.cli.command('enqueue-job')
+@click.argument('kind', type=click.Choice(list(JOB_HANDLERS)))
+@click.option('--param', 'params', multiple=True, metavar='KEY=VALUE', help='Job parameter (repeatable).')
+@click.option('--max-attempts', type=int, default=None)
+def enqueue_job_command(kind, params, max_attempts):
+    params = dict(param.split('=', 1) for param in params)
+    if 'path' in params:
+        params['path'] = os.path.abspath(params['path'])
+    with default_engine().begin() as conn:
+        job_id = enqueue_job(conn, kind, params, max_attempts)
+    print(f'Queued job {job_id} ({kind})')
+
+@app.cli.command('run-jobs')
+@click.option('--workers', type=int, default=None, help='Worker processes (defaults to JOB_WORKERS).')
+@click.option('--drain', is_flag=True, help='Exit once the queue is empty instead of polling.')
+def run_jobs_command(workers, drain):
+    workers = workers or app.config['JOB_WORKERS']
+    processes = [
+        multiprocessing.Process(target=job_worker_loop, args=(f'{os.getpid()}-{n}', drain), daemon=True)
+        for n in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f'Started {workers} job worker(s)')
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+# Schema migrations
+# create_all() only creates missing tables, so changes to existing tables ship
+# as numbered migrations. Each runs once, in its own transaction, and is
+# recorded in schema_migrations. Steps are SQL strings or callables taking the
+# connection, and must be idempotent, because a fresh database already gets the
+# current schema from create_schema().
+MIGRATIONS = [
+    (1, 'reverse indexes for association tables and book.publisher_id', [
+        "CREATE INDEX IF NOT EXISTS ix_book_authors_author_id ON book_authors (author_id, book_id)",
+        "CREATE INDEX IF NOT EXISTS ix_book_genres_genre_id ON book_genres (genre_id, book_id)",
+        "CREATE INDEX IF NOT EXISTS ix_book_publisher_id ON book (publisher_id)",
+        # Duplicates the index behind book.isbn's UNIQUE constraint
+        "DROP INDEX IF EXISTS ix_book_isbn",
+        "ANALYZE",
+    ]),
+    # Databases from before init-db created the derived tables (or upgraded
+    # with only migration 1) have just the catalog tables
+    (2, 'derived tables, triggers, views and search index', [
+        lambda conn: create_base_schema(conn),
+        lambda conn: rebuild_derived_tables(conn),
+    ]),
+    # CREATE TRIGGER IF NOT EXISTS leaves the old, unguarded definitions in place
+    (3, 'suspendable search-index and catalog-version triggers', [
+        *[f"DROP TRIGGER IF EXISTS {name}" for name in SUSPENDABLE_TRIGGERS],
+        lambda conn: create_base_schema(conn),
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+def schema_is_current(conn):
+    try:
+        return get_schema_version(conn) >= SCHEMA_VERSION
+    except OperationalError:
+        # No schema_migrations table: never initialized, or predates migrations
+        conn.rollback()
+        return False
+
+def apply_migrations():
+    schema_migrations.create(db.engine, checkfirst=True)
+    applied = []
+    for version, name, statements in MIGRATIONS:
+        with db.engine.begin() as conn:
+            if version <= get_schema_version(conn):
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(text(statement))
+            conn.execute(insert(schema_migrations), {'version': version, 'name': name, 'applied_at': utcnow()})
+        applied.append((version, name))
+    return applied
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    with db.engine.connect() as conn:
+        if not inspect(conn).has_table('book'):
+            print('Database is not initialized; run `flask init-db`.')
+            return
+    applied = apply_migrations()
+    for version, name in applied:
+        print(f'Applied migration {version}: {name}')
+    with db.engine.connect() as conn:
+        print(f'Schema is at version {get_schema_version(conn)}.')
 
 # Initialize the database
-@app.cli.command('init-db')
-def init_db_command():
-    db.create_all()
-    
+def create_base_schema(conn):
+    # Tables, views, triggers and the search index. Every statement is
+    # idempotent, so this also completes a partially created schema.
+    db.metadata.create_all(conn)
+
     # Create stored procedures (views)
-    with db.engine.connect() as conn:
-        for proc in STORED_PROCEDURES:
-            conn.execute(text(proc))
+    for proc in STORED_PROCEDURES:
+        conn.execute(text(proc))
+
+    # Create the counter triggers for the dashboard totals, the triggers
+    # maintaining the report summary tables and those bumping the catalog
+    # version on every write
+    for trigger in [*STATS_TRIGGERS, *REPORT_TRIGGERS, *CATALOG_VERSION_TRIGGERS]:
+        conn.execute(text(trigger))
+    conn.execute(text("""
+        INSERT OR IGNORE INTO catalog_version (id, version, updated_at)
+        VALUES (1, 0, CURRENT_TIMESTAMP)
+    """))
+
+    # Create the full-text search index and its sync triggers
+    for ddl in SEARCH_INDEX_DDL:
+        conn.execute(text(ddl))
+
+def create_schema(force=False):
+    # Returns False without issuing any DDL when the schema is already at
+    # SCHEMA_VERSION. Migrations are applied last, so a recorded version means
+    # every statement below has run.
+    if not force:
+        with db.engine.connect() as conn:
+            if schema_is_current(conn):
+                return False
+
+    with db.engine.begin() as conn:
+        create_base_schema(conn)
+
+    apply_migrations()
+    return True
+
+def rebuild_derived_tables(conn):
+    rebuild_catalog_stats(conn)
+    rebuild_search_index(conn)
+    rebuild_report_tables(conn)
+
+@app.cli.command('init-db')
+@click.option('--force', is_flag=True, help='Re-run the DDL and rebuild derived tables even if the schema is current.')
+def init_db_command(force):
+    if not create_schema(force=force):
+        print(f'Database schema is already at version {SCHEMA_VERSION}; nothing to do (use --force to rebuild).')
+        return
     
     # Add sample data
     if Author.query.count() == 0:
@@ -663,7 +3073,237 @@ def init_db_command():
         db.session.add_all(publishers)
     
     db.session.commit()
+
+    with db.engine.begin() as conn:
+        rebuild_derived_tables(conn)
     print('Database initialized with sample data and stored procedures!')
 
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    with db.engine.begin() as conn:
+        rebuild_search_index(conn)
+    print('Search index rebuilt.')
+
+@app.cli.command('rebuild-reports')
+def rebuild_reports_command():
+    with db.engine.begin() as conn:
+        rebuild_report_tables(conn)
+    print('Report summary tables rebuilt.')
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    with db.engine.begin() as conn:
+        rebuild_catalog_stats(conn)
+        stats = get_catalog_stats(conn)
+    print(f'Catalog counters rebuilt: {stats.total_books} books, {stats.total_authors} authors, '
+          f'{stats.total_genres} genres, {stats.total_publishers} publishers.')
+
+# Query plan audit
+# explain-routes requests every route with the test client, records the SQL it
+# issues and prints each statement's EXPLAIN QUERY PLAN, flagging full table
+# scans ("!!") and index scans / temporary sort trees ("~"). Writes are replaced
+# by their EXPLAIN QUERY PLAN while the audit runs, so POST routes (the delete
+# guards) can be exercised without changing the database.
+PLAN_WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+def _explain_requests():
+    # (method, url, form data) for every route, with ids of existing rows
+    with db.engine.connect() as conn:
+        first_ids = {name: conn.execute(select(func.min(model.id))).scalar() or 1
+                     for name, model in [('book', Book), *LOOKUP_MODELS.items(), ('job', Job)]}
+        genre_id = first_ids['genre']
+    requests = [
+        ('GET', url_for('index', genre=genre_id, in_stock=1), None),
+        ('GET', url_for('index', published_from='2000-01-01', published_to='2010-12-31'), None),
+        ('POST', url_for('search_books'), {'search_term': 'the'}),
+    ]
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static':
+            continue
+        method = 'POST' if rule.endpoint.startswith('delete_') else 'GET'
+        if method not in rule.methods:
+            continue
+        variants = [{}]
+        if 'resource' in rule.arguments:
+            variants = [{'resource': resource} for resource in API_RESOURCES]
+        elif 'entity' in rule.arguments:
+            variants = [{'entity': entity, 'q': 'a'} for entity in LOOKUP_MODELS]
+        elif 'fmt' in rule.arguments:
+            variants = [{'fmt': fmt} for fmt in EXPORT_FORMATS]
+        for args in variants:
+            if 'id' in rule.arguments:
+                # Delete guards run against a missing row; everything else gets a real one
+                entity = next((name for name in first_ids if name in rule.endpoint or name in rule.rule), 'book')
+                args = {**args, 'id': 0 if method == 'POST' else first_ids[entity]}
+                if rule.endpoint == 'api.api_detail':
+                    args['id'] = first_ids.get(args['resource'].rstrip('s'), 1)
+            requests.append((method, url_for(rule.endpoint, **args), None))
+    return requests
+
+def _classify_plan_line(detail, bounded):
+    # bounded: the statement has a LIMIT and no sort, so a rowid-order scan
+    # stops early instead of reading the whole table
+    if detail.startswith('SCAN '):
+        name = detail.split()[1]
+        if name in db.metadata.tables and ' USING ' not in detail:
+            return '~' if bounded else '!!'
+        if ' USING ' in detail:
+            return '~'
+    if 'USE TEMP B-TREE' in detail:
+        return '~'
+    return ' '
+
+@app.cli.command('explain-routes')
+@click.option('--all', 'show_all', is_flag=True, help='Print plans without scans too.')
+@click.option('--strict', is_flag=True, help='Exit with status 1 if any full table scan is found.')
+def explain_routes_command(show_all, strict):
+    issued = {}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(('SELECT', 'WITH', *PLAN_WRITE_PREFIXES)):
+            return statement, parameters
+        sample = parameters[0] if executemany and parameters else parameters
+        key = ' '.join(statement.split())
+        issued.setdefault(key, (statement, sample, set()))[2].add(
+            request.endpoint if has_request_context() else 'app')
+        if statement.lstrip().upper().startswith(PLAN_WRITE_PREFIXES):
+            return 'EXPLAIN QUERY PLAN ' + statement, parameters
+        return statement, parameters
+
+    for cache in (lookup_cache, page_cache, details_cache):
+        cache.clear()
+    with app.test_request_context():
+        requests = _explain_requests()
+    engines = {db.engine, get_read_engine()}
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', capture, retval=True)
+    try:
+        client = app.test_client()
+        for method, url, data in requests:
+            response = client.open(url, method=method, data=data)
+            response.get_data()  # drain streamed responses
+            response.close()
+            if response.status_code >= 500:
+                print(f'{method} {url} -> {response.status_code}')
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', capture)
+
+    full_scans = 0
+    with db.engine.connect() as conn:
+        dbapi_conn = conn.connection.dbapi_connection
+        for key, (statement, parameters, endpoints) in sorted(issued.items(), key=lambda item: sorted(item[1][2])):
+            if key.upper().startswith('EXPLAIN'):
+                continue
+            try:
+                plan = [row[-1] for row in dbapi_conn.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ())]
+            except Exception as e:
+                plan = [f'unavailable: {e}']
+            bounded = ' LIMIT ' in key.upper() and not any('USE TEMP B-TREE' in line for line in plan)
+            marks = [_classify_plan_line(line, bounded) for line in plan]
+            full_scans += marks.count('!!')
+            if not show_all and set(marks) <= {' '}:
+                continue
+            print(f"[{', '.join(sorted(endpoints))}] {key}")
+            for mark, line in zip(marks, plan):
+                print(f'  {mark} {line}')
+    print(f'{len(issued)} distinct statements, {full_scans} full table scan(s).')
+    if strict and full_scans:
+        raise SystemExit(1)
+
+# Application factory
+# Importing this module only declares the app (config, models, routes).
+# create_app() does the one-time setup: binding SQLAlchemy (which creates the
+# engine), engine listeners, blueprint registration, sizing the caches and
+# metrics from the final config and a schema version check. It also runs on the
+# first app context push, so `flask --app app`, app:app under a WSGI server and
+# the test client need no changes.
+_initialized = False
+_init_lock = threading.Lock()
+_init_steps_done = set()
+
+def create_app(config=None):
+    if config:
+        if _initialized:
+            raise RuntimeError('create_app(config) must be called before the app is first used')
+        app.config.update(config)
+    if not _initialized:
+        with app.app_context():
+            pass  # _initialize_app runs on the push
+    return app
+
+def _initialize_app(sender, **extra):
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        # Steps are recorded as they complete, so after a failure (say, an
+        # unopenable database) the next push retries only what has not run
+        for step in INIT_STEPS:
+            if step not in _init_steps_done:
+                step()
+                _init_steps_done.add(step)
+        _initialized = True
+
+def _bind_database():
+    if 'sqlalchemy' not in app.extensions:
+        db.init_app(app)
+    engine = default_engine()
+    event.listen(engine, 'connect', apply_sqlite_pragmas)
+    instrument_engine(engine)
+
+def configure_caches():
+    # The caches and metrics exist at import time; size them from the config
+    # create_app() was given
+    for cache, prefix in [(lookup_cache, 'LOOKUP_CACHE'), (page_cache, 'PAGE_CACHE'),
+                          (details_cache, 'BOOK_DETAILS_CACHE')]:
+        cache.ttl = app.config[f'{prefix}_TTL']
+        cache.max_entries = app.config[f'{prefix}_MAX_ENTRIES']
+        cache.clear()
+    metrics.buckets = app.config['METRICS_LATENCY_BUCKETS']
+
+def _preload_templates_if_enabled():
+    if app.config['TEMPLATE_PRELOAD']:
+        preload_templates()
+
+def preload_templates():
+    # Compile every template now rather than on first use. Outside debug mode
+    # Jinja's auto_reload is off, so compiled templates are never re-checked.
+    # On a read-only filesystem they are compiled without the bytecode cache.
+    cache_dir = app.config['TEMPLATE_BYTECODE_CACHE_DIR'] or os.path.join(app.instance_path, 'jinja_cache')
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if not os.access(cache_dir, os.W_OK | os.X_OK):
+            raise PermissionError(f'{cache_dir} is not writable')
+    except OSError as e:
+        app.logger.warning('Template bytecode cache disabled: %s', e)
+        app.jinja_env.bytecode_cache = None
+    else:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+def check_schema_version():
+    with db.engine.connect() as conn:
+        if schema_is_current(conn) or not inspect(conn).has_table('book'):
+            return  # current, or not initialized yet (init-db will create it)
+    if app.config['SCHEMA_AUTO_UPGRADE']:
+        for version, name in apply_migrations():
+            app.logger.warning('Applied migration %s: %s', version, name)
+    else:
+        app.logger.warning('Database schema is behind version %s; run `flask db-upgrade`.', SCHEMA_VERSION)
+
+INIT_STEPS = [
+    _bind_database,
+    lambda: app.register_blueprint(api),
+    configure_caches,
+    _preload_templates_if_enabled,
+    check_schema_version,
+]
+
+appcontext_pushed.connect(_initialize_app, app)
+
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=5001, debug=True)
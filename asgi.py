@@ -0,0 +1,227 @@
+# ASGI entry point
+#
+# Serves the read-heavy routes (index, search_books, book_details and both
+# reports) as async views on an aiosqlite engine, so one worker can multiplex
+# many concurrent slow clients instead of parking a thread per request on
+# SQLite I/O. Every other route, and every request for a branch shard other
+# than the default library, is handed to the regular WSGI app.
+#
+#     uvicorn asgi:application --host 127.0.0.1 --port 8000
+#
+# Requires sqlalchemy[asyncio], aiosqlite and asgiref (plus an ASGI server such
+# as uvicorn).
+# benchmarks/loadtest.py compares this mode against the threaded server.
+from asgiref.wsgi import WsgiToAsgi
+from flask import Response, flash, redirect, render_template, request, session, url_for
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.test import EnvironBuilder
+
+from app import (app, create_app, db, apply_sqlite_pragmas, book_details_etag, catalog_etag,
+                 catalog_not_modified, decode_cursor, details_cache, fetch_report_page, get_book_filters,
+                 get_book_versions, get_catalog_version, get_page_size, get_report_page_args, get_search_limit,
+                 instrument_engine, load_index_context, search_catalog, set_catalog_validators, tenant_key,
+                 BOOK_DETAILS_STMT)
+
+create_app()
+wsgi_application = WsgiToAsgi(app)
+
+
+def create_async_db_engine():
+    # Same database and pool settings as the sync engine, on the aiosqlite driver
+    with app.app_context():
+        url = db.engine.url
+    if url.drivername in ('sqlite', 'sqlite+pysqlite'):
+        url = url.set(drivername='sqlite+aiosqlite')
+    engine = create_async_engine(app.config.get('ASYNC_DATABASE_URI') or url,
+                                 **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    event.listen(engine.sync_engine, 'connect', apply_sqlite_pragmas)
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+async_engine = create_async_db_engine()
+
+
+# Async views. They run inside a Flask request context, so request/session,
+# url_for and render_template behave exactly as in the WSGI views; database
+# work is awaited and reuses the sync helpers through run_sync.
+async def index():
+    per_page = get_page_size()
+    after = decode_cursor(request.args.get('after'))
+    before = None if after else decode_cursor(request.args.get('before'))
+
+    async with async_engine.connect() as conn:
+        version, updated_at = await conn.run_sync(get_catalog_version)
+        etag = catalog_etag(version)
+        if not session.get('_flashes') and catalog_not_modified(etag, updated_at):
+            return set_catalog_validators(Response(status=304), etag, updated_at)
+        context = await conn.run_sync(load_index_context, after, before, per_page, get_book_filters())
+
+    response = app.make_response(render_template('index.html', **context))
+    if session.get('_flashes') or context['facets_stale']:
+        return response
+    return set_catalog_validators(response, etag, updated_at)
+
+
+async def search_books():
+    if request.method != 'POST':
+        return render_template('search_form.html')
+    search_term = request.form['search_term']
+    async with async_engine.connect() as conn:
+        books = await conn.run_sync(search_catalog, search_term, get_search_limit())
+    return render_template('search_results.html', books=books, search_term=search_term)
+
+
+async def book_details(id):
+    async with async_engine.connect() as conn:
+        versions = await conn.run_sync(get_book_versions, id)
+        etag = book_details_etag(id, versions)
+        if etag in request.if_none_match:
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+        result = await conn.execute(BOOK_DETAILS_STMT, {"book_id": id})
+        book = result.fetchone()
+
+    if not book:
+        details_cache.invalidate(tenant_key(id))
+        flash('Book not found', 'danger')
+        return redirect(url_for('index'))
+
+    if session.get('_flashes'):
+        html = render_template('book_details.html', book=book)
+    else:
+        html = details_cache.get(tenant_key(id), lambda: render_template('book_details.html', book=book),
+                                 version=versions)
+    response = app.make_response(html)
+    response.set_etag(etag)
+    return response
+
+
+async def books_by_genre():
+    limit, offset, page = get_report_page_args()
+    async with async_engine.connect() as conn:
+        genre_stats, as_of = await conn.run_sync(fetch_report_page, 'books_by_genre', limit, offset)
+    return render_template('report_books_by_genre.html', genre_stats=genre_stats[:limit],
+                           as_of=as_of, page=page, per_page=limit,
+                           has_next=len(genre_stats) > limit and not request.args.get('top'))
+
+
+async def authors_by_books():
+    limit, offset, page = get_report_page_args()
+    async with async_engine.connect() as conn:
+        author_stats, as_of = await conn.run_sync(fetch_report_page, 'authors_by_books', limit, offset)
+    return render_template('report_authors_by_books.html', author_stats=author_stats[:limit],
+                           as_of=as_of, page=page, per_page=limit,
+                           has_next=len(author_stats) > limit and not request.args.get('top'))
+
+
+# Flask endpoint -> (async view, methods served asynchronously)
+ASYNC_VIEWS = {
+    'index': (index, {'GET', 'HEAD'}),
+    'search_books': (search_books, {'GET', 'POST'}),
+    'book_details': (book_details, {'GET', 'HEAD'}),
+    'books_by_genre': (books_by_genre, {'GET', 'HEAD'}),
+    'authors_by_books': (authors_by_books, {'GET', 'HEAD'}),
+}
+
+
+async def _read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+def _build_environ(scope, body):
+    headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']]
+    server = scope.get('server') or ('localhost', 80)
+    builder = EnvironBuilder(
+        path=scope['path'],
+        base_url=f"{scope.get('scheme', 'http')}://{server[0]}:{server[1]}{scope.get('root_path', '')}",
+        method=scope['method'],
+        query_string=scope['query_string'].decode('latin-1'),
+        headers=headers,
+        data=body,
+    )
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    return environ
+
+
+async def _send_response(send, response, method):
+    body = b'' if response.status_code == 304 or method == 'HEAD' else response.get_data()
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _for_other_branches():
+    # async_engine only serves the default library, so shard and all-branch
+    # requests go through WSGI
+    if not app.config['SHARDING_ENABLED']:
+        return False
+    tenant = request.headers.get(app.config['TENANT_HEADER'])
+    return tenant not in (None, '', app.config['DEFAULT_TENANT']) or request.values.get('scope') == 'all'
+
+
+async def _handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _handle_lifespan(receive, send)
+    if scope['type'] != 'http':
+        return await wsgi_application(scope, receive, send)
+
+    body = await _read_body(receive)
+    with app.request_context(_build_environ(scope, body)):
+        view = None if _for_other_branches() else ASYNC_VIEWS.get(request.endpoint)
+        if view is not None and request.method in view[1]:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view[0](**request.view_args)
+                response = app.process_response(app.make_response(rv))
+            except Exception as e:
+                try:
+                    rv = app.handle_user_exception(e)
+                except Exception as unhandled:
+                    rv = app.handle_exception(unhandled)
+                response = app.make_response(rv)
+            await _send_response(send, response, scope['method'])
+            return
+
+    # Not an async route: replay the buffered body into the WSGI app
+    replayed = False
+
+    async def replay_receive():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return await receive()
+
+    await wsgi_application(scope, replay_receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:application', host='127.0.0.1', port=8000)
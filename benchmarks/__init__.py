@@ -0,0 +1,10 @@
+# Benchmark suite for the library manager.
+#
+# Generates a synthetic catalog in a scratch database, drives the main routes
+# through the Flask test client with the rendered page caches off and compares
+# query counts and peak memory against a stored baseline (latency percentiles
+# too with --compare-latency, on the machine that recorded it). Run with:
+#
+#     python -m benchmarks.run --baseline benchmarks/baseline.json
+#
+# benchmarks/startup.py measures import time and cold start separately.
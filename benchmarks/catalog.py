@@ -0,0 +1,60 @@
+# Synthetic catalog generator
+import random
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from app import Author, Book, Genre, Publisher, book_authors, book_genres
+
+WORDS = ['shadow', 'river', 'empire', 'garden', 'winter', 'silver', 'secret', 'night',
+         'ocean', 'crown', 'forest', 'machine', 'glass', 'storm', 'letter', 'house',
+         'stone', 'journey', 'memory', 'fire', 'island', 'mirror', 'city', 'song']
+
+
+def _title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).capitalize()
+
+
+def generate_catalog(conn, books=10000, authors=2000, genres=50, publishers=200,
+                     authors_per_book=2, genres_per_book=2, batch_size=5000, seed=42):
+    # Inserts a reproducible catalog: the same arguments and seed always
+    # produce the same rows. Association fan-out is picked per book between
+    # 1 and the given maximum.
+    rng = random.Random(seed)
+
+    conn.execute(insert(Publisher), [
+        {'name': f'Publisher {i}', 'address': f'{i} Main Street', 'contact': f'info@publisher{i}.example'}
+        for i in range(publishers)
+    ])
+    conn.execute(insert(Genre), [
+        {'name': f'Genre {i}', 'description': f'Description of genre {i}. ' * 5}
+        for i in range(genres)
+    ])
+    conn.execute(insert(Author), [
+        {'name': f'{rng.choice(WORDS).capitalize()} Author {i}', 'biography': 'Biography text. ' * 20}
+        for i in range(authors)
+    ])
+
+    epoch = date(1900, 1, 1)
+    for start in range(0, books, batch_size):
+        count = min(batch_size, books - start)
+        conn.execute(insert(Book), [
+            {
+                'id': start + i + 1,
+                'title': _title(rng),
+                'isbn': f'978-{start + i:010d}',
+                'publication_date': epoch + timedelta(days=rng.randint(0, 45000)),
+                'copies_available': rng.randint(0, 10),
+                'publisher_id': rng.randint(1, publishers),
+            }
+            for i in range(count)
+        ])
+        author_rows = []
+        genre_rows = []
+        for book_id in range(start + 1, start + count + 1):
+            for author_id in rng.sample(range(1, authors + 1), rng.randint(1, authors_per_book)):
+                author_rows.append({'book_id': book_id, 'author_id': author_id})
+            for genre_id in rng.sample(range(1, genres + 1), rng.randint(1, genres_per_book)):
+                genre_rows.append({'book_id': book_id, 'genre_id': genre_id})
+        conn.execute(insert(book_authors), author_rows)
+        conn.execute(insert(book_genres), genre_rows)
@@ -0,0 +1,89 @@
+# Load-test comparison between serving modes.
+#
+# Start the app under both servers against the same database, e.g.
+#
+#     gunicorn --threads 8 --workers 1 -b 127.0.0.1:5001 app:app
+#     uvicorn asgi:application --workers 1 --port 8000
+#
+# then compare them with many concurrent (and optionally slow) clients:
+#
+#     python -m benchmarks.loadtest --target threaded=http://127.0.0.1:5001 \
+#         --target asgi=http://127.0.0.1:8000 --concurrency 64 --requests 2000
+import argparse
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.run import percentile
+
+DEFAULT_PATHS = ['/', '/book/details/1', '/reports/books_by_genre', '/reports/authors_by_books']
+
+
+def fetch(url, read_delay):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            if read_delay:
+                # Simulate a slow client draining the response
+                while response.read(4096):
+                    time.sleep(read_delay)
+            else:
+                response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = None
+    return time.perf_counter() - started, status
+
+
+def run_target(base_url, paths, requests, concurrency, read_delay):
+    urls = [base_url.rstrip('/') + paths[i % len(paths)] for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda url: fetch(url, read_delay), urls))
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds * 1000 for seconds, status in results if status and status < 400]
+    errors = len(results) - len(latencies)
+    if not latencies:
+        return {'throughput_rps': 0.0, 'errors': errors}
+    return {
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'errors': errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare serving modes under concurrent load.')
+    parser.add_argument('--target', action='append', required=True,
+                        help='name=base_url of a running server (repeatable).')
+    parser.add_argument('--path', action='append', help='Path to request (repeatable).')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--read-delay', type=float, default=0.0,
+                        help='Seconds to sleep between 4 KB reads, to emulate slow clients.')
+    args = parser.parse_args(argv)
+
+    paths = args.path or DEFAULT_PATHS
+    print(f'{args.requests} requests, concurrency {args.concurrency}, paths: {", ".join(paths)}')
+    for target in args.target:
+        name, _, base_url = target.partition('=')
+        r = run_target(base_url, paths, args.requests, args.concurrency, args.read_delay)
+        if 'p50_ms' not in r:
+            print(f'{name:10} all requests failed ({r["errors"]} errors)')
+            continue
+        print(f"{name:10} {r['throughput_rps']:8.1f} req/s  p50 {r['p50_ms']:8.2f} ms  "
+              f"p95 {r['p95_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms  errors {r['errors']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# Benchmark driver: builds a catalog, exercises the main routes through the
+# Flask test client and reports/compares latency, query counts and memory.
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_scenarios(app, args):
+    # Each scenario is (name, callable(client, iteration)). Writes use a fresh
+    # ISBN per iteration so they never collide.
+    books = args.books
+
+    def book_id(i):
+        return (i * 7919) % books + 1
+
+    def index(client, i):
+        return client.get('/')
+
+    def index_page(client, i):
+        # Walk to the page after the first one through its keyset cursor
+        first = client.get('/?per_page=50').get_data(as_text=True)
+        marker = 'after='
+        start = first.find(marker)
+        if start == -1:
+            return client.get('/?per_page=50')
+        cursor = first[start + len(marker):].split('&', 1)[0].split('"', 1)[0]
+        return client.get(f'/?per_page=50&after={cursor}')
+
+    def search(client, i):
+        term = ['shadow', 'riv', 'empire garden', 'author 1', 'genre 3'][i % 5]
+        return client.post('/book/search', data={'search_term': term})
+
+    def details(client, i):
+        return client.get(f'/book/details/{book_id(i)}')
+
+    def books_by_genre(client, i):
+        return client.get('/reports/books_by_genre')
+
+    def authors_by_books(client, i):
+        return client.get('/reports/authors_by_books')
+
+    def new_book(client, i):
+        return client.post('/book/new', data={
+            'title': f'Benchmark book {i}', 'isbn': f'bench-{time.time_ns()}-{i}',
+            'publisher': '1', 'publication_date': '2020-01-01', 'copies_available': '3',
+            'authors': ['1', '2'], 'genres': ['1'],
+        })
+
+    def edit_book(client, i):
+        return client.post(f'/book/edit/{book_id(i)}', data={
+            'title': f'Edited title {i}', 'isbn': f'978-{book_id(i) - 1:010d}',
+            'publisher': '2', 'publication_date': '2001-05-06', 'copies_available': str(i % 5),
+            'authors': [str(i % 50 + 1)], 'genres': [str(i % 10 + 1)],
+        })
+
+    return [
+        ('index', index),
+        ('index_page', index_page),
+        ('search_books', search),
+        ('book_details', details),
+        ('books_by_genre', books_by_genre),
+        ('authors_by_books', authors_by_books),
+        ('new_book', new_book),
+        ('edit_book', edit_book),
+    ]
+
+
+def run_scenario(app, db, name, fn, iterations, warmup):
+    from sqlalchemy import event
+    from app import get_read_engine
+
+    client = app.test_client()
+    counter = {'queries': 0}
+
+    def count(*_):
+        counter['queries'] += 1
+
+    for i in range(warmup):
+        fn(client, i)
+
+    # Read-only routes go through the read engine; count both
+    engines = {db.engine, get_read_engine()}
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+    latencies = []
+    queries = []
+    tracemalloc.start()
+    try:
+        for i in range(iterations):
+            counter['queries'] = 0
+            started = time.perf_counter()
+            response = fn(client, warmup + i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(counter['queries'])
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name}: HTTP {response.status_code}')
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', count)
+
+    return {
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance, latency=False):
+    # A scenario regresses when it issues more queries than the baseline or its
+    # peak memory grows beyond the tolerance. Latency percentiles depend on the
+    # machine and are noisy, so p95 is only compared when asked for.
+    regressions = []
+    metrics = ('p95_ms', 'peak_memory_kb') if latency else ('peak_memory_kb',)
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for metric in metrics:
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {previous[metric]} -> {current[metric]}')
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(f"{name}: queries_per_request {previous['queries_per_request']} "
+                               f"-> {current['queries_per_request']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the library manager routes.')
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--authors', type=int, default=2000)
+    parser.add_argument('--genres', type=int, default=50)
+    parser.add_argument('--publishers', type=int, default=200)
+    parser.add_argument('--authors-per-book', type=int, default=2)
+    parser.add_argument('--genres-per-book', type=int, default=2)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenario', action='append', help='Only run the named scenario(s).')
+    parser.add_argument('--enable-caches', action='store_true',
+                        help='Keep the rendered page caches on (measures cache hits, not the routes).')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against.')
+    parser.add_argument('--save-baseline', help='Write the results to this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative growth before a metric counts as a regression.')
+    parser.add_argument('--compare-latency', action='store_true',
+                        help='Also fail on p95 latency growth (only meaningful on the baseline machine).')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bookmanager-bench-')
+    os.environ['BOOKMANAGER_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    import app as app_module
+    from app import db
+
+    config = {'METRICS_ENABLED': False, 'SLOW_QUERY_THRESHOLD_MS': float('inf')}
+    if not args.enable_caches:
+        # Every request renders the route instead of replaying a cached page
+        config.update(PAGE_CACHE_MAX_ENTRIES=0, BOOK_DETAILS_CACHE_MAX_ENTRIES=0)
+    app = app_module.create_app(config)
+
+    with app.app_context():
+
+        started = time.perf_counter()
+        app_module.create_schema()
+        with db.engine.begin() as conn:
+            from benchmarks.catalog import generate_catalog
+            generate_catalog(conn, books=args.books, authors=args.authors, genres=args.genres,
+                             publishers=args.publishers, authors_per_book=args.authors_per_book,
+                             genres_per_book=args.genres_per_book, seed=args.seed)
+            app_module.rebuild_derived_tables(conn)
+        print(f'Generated {args.books} books in {time.perf_counter() - started:.1f}s ({workdir})')
+
+        results = {}
+        for name, fn in build_scenarios(app, args):
+            if args.scenario and name not in args.scenario:
+                continue
+            results[name] = run_scenario(app, db, name, fn, args.iterations, args.warmup)
+            r = results[name]
+            print(f"{name:18} p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  "
+                  f"p99 {r['p99_ms']:8.2f} ms  queries {r['queries_per_request']:6.2f}  "
+                  f"peak {r['peak_memory_kb']:9.1f} KB")
+
+    report = {
+        'config': {k: v for k, v in vars(args).items()
+                   if k not in ('baseline', 'save_baseline', 'scenario', 'compare_latency')},
+        'results': results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fh:
+            baseline = json.load(fh)
+        recorded = baseline.get('config', {})
+        if recorded.get('books') != args.books:
+            print('Warning: baseline was recorded with a different catalog size')
+        if recorded.get('enable_caches', False) != args.enable_caches:
+            print('Warning: baseline was recorded with the page caches switched the other way')
+        regressions = compare(results, baseline, args.tolerance, latency=args.compare_latency)
+        if regressions:
+            print('Regressions against baseline:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print('No regressions against baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# Startup benchmark: import time, app initialization and first-request latency
+# of a fresh interpreter, i.e. what every preforked worker, CLI invocation or
+# serverless cold start pays before serving anything.
+#
+#     python -m benchmarks.startup --runs 20 --baseline benchmarks/startup_baseline.json
+#
+# Each run is a new process against the same scratch database. --importtime
+# lists the slowest modules from `python -X importtime`.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run import percentile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process; prints one JSON line of timings in milliseconds
+CHILD_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app({'METRICS_ENABLED': False})
+initialized = time.perf_counter()
+response = app.test_client().get('/')
+assert response.status_code == 200, response.status_code
+first_request = time.perf_counter()
+response = app.test_client().get('/book/search')
+second_route = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'init_ms': (initialized - imported) * 1000,
+    'first_request_ms': (first_request - initialized) * 1000,
+    'second_route_ms': (second_route - first_request) * 1000,
+    'cold_start_ms': (first_request - started) * 1000,
+}))
+"""
+
+METRICS = ('import_ms', 'init_ms', 'first_request_ms', 'second_route_ms', 'cold_start_ms', 'process_ms')
+
+
+def prepare_database(env):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'],
+                   cwd=REPO_ROOT, env=env, check=True, capture_output=True)
+
+
+def run_once(env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD_SCRIPT], cwd=REPO_ROOT, env=env,
+                            check=True, capture_output=True, text=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process_ms'] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def slowest_imports(env, top):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=REPO_ROOT, env=env, check=True, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for metric, current in results.items():
+        previous = baseline.get('results', {}).get(metric)
+        if previous and current['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{metric}: p50 {previous['p50_ms']} -> {current['p50_ms']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark import time and cold start of the app.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help='Also list the N slowest imports (by cumulative time).')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against.')
+    parser.add_argument('--save-baseline', help='Write the results to this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative growth before a metric counts as a regression.')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bookmanager-startup-')
+    env = dict(os.environ, BOOKMANAGER_DATABASE_URI=f"sqlite:///{os.path.join(workdir, 'startup.db')}")
+    prepare_database(env)
+
+    samples = {metric: [] for metric in METRICS}
+    for _ in range(args.runs):
+        for metric, value in run_once(env).items():
+            samples[metric].append(value)
+
+    results = {}
+    for metric in METRICS:
+        values = samples[metric]
+        results[metric] = {
+            'p50_ms': round(percentile(values, 50), 2),
+            'p95_ms': round(percentile(values, 95), 2),
+            'mean_ms': round(statistics.mean(values), 2),
+        }
+        r = results[metric]
+        print(f"{metric:18} p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  mean {r['mean_ms']:8.2f} ms")
+
+    if args.importtime:
+        print('Slowest imports (cumulative / self, ms):')
+        for cumulative_us, self_us, name in slowest_imports(env, args.importtime):
+            print(f'  {cumulative_us / 1000:8.1f} {self_us / 1000:8.1f}  {name}')
+
+    report = {'config': {'runs': args.runs}, 'results': results}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fh:
+            baseline = json.load(fh)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('Regressions against baseline:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print('No regressions against baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
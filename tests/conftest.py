@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import delete, event, insert
+
+import app as app_module
+from app import Author, Book, Genre, Job, Loan, Publisher, book_authors, book_genres, db, get_read_engine
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp('bookmanager')
+    application = app_module.create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp / 'library.db'}",
+        'METRICS_ENABLED': False,
+        'TEMPLATE_BYTECODE_CACHE_DIR': str(tmp / 'jinja_cache'),
+        'TENANT_DATABASE_DIR': str(tmp / 'tenants'),
+    })
+    with application.app_context():
+        app_module.create_schema()
+    return application
+
+
+@pytest.fixture
+def catalog(app):
+    # An empty catalog and cold caches. catalog_version and cache_versions keep
+    # counting up, so no entry cached by an earlier test can match again.
+    with app.app_context():
+        with db.engine.begin() as connection:
+            for table in [book_authors, book_genres, Loan.__table__, Job.__table__, Book.__table__,
+                          Author.__table__, Genre.__table__, Publisher.__table__]:
+                connection.execute(delete(table))
+            app_module.rebuild_derived_tables(connection)
+        for cache in (app_module.lookup_cache, app_module.page_cache, app_module.details_cache):
+            cache.clear()
+        app_module.facet_indexes.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    # Every SQL statement issued on the primary and read engines
+    issued = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        issued.append(statement)
+
+    with app.app_context():
+        engines = {db.engine, get_read_engine()}
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    yield issued
+    for engine in engines:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def add_book(title, copies=1, authors=(), genres=(), publisher_id=None, isbn=None):
+    # Commits through the primary engine of the current tenant, like the views
+    with app_module.app.app_context(), db.engine.begin() as conn:
+        book_id = conn.execute(
+            insert(Book).returning(Book.id),
+            {'title': title, 'isbn': isbn or f'isbn-{title}', 'copies_available': copies,
+             'publisher_id': publisher_id}
+        ).scalar_one()
+        for author_id in authors:
+            conn.execute(insert(book_authors), {'book_id': book_id, 'author_id': author_id})
+        for genre_id in genres:
+            conn.execute(insert(book_genres), {'book_id': book_id, 'genre_id': genre_id})
+    return book_id
+
+
+def add_named(model, name):
+    with app_module.app.app_context(), db.engine.begin() as conn:
+        return conn.execute(insert(model).returning(model.id), {'name': name}).scalar_one()
+
+
+async def asgi_request(application, method, path, query=b'', body=b'', headers=()):
+    # Drives an ASGI app directly; returns (status, headers, body)
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'root_path': '',
+             'scheme': 'http', 'server': ('localhost', 80), 'http_version': '1.1',
+             'headers': [(name.lower().encode(), value.encode()) for name, value in headers]}
+    sent = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {'type': 'http.disconnect'}
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    response_headers = {name.decode(): value.decode() for name, value in sent[0]['headers']}
+    return sent[0]['status'], response_headers, b''.join(m.get('body', b'') for m in sent[1:])
+
+
+def run_async(coroutine_fn, timeout=10):
+    # Runs an event loop in a worker thread so a blocked loop fails the test
+    # instead of hanging it
+    results = []
+    thread = threading.Thread(target=lambda: results.append(asyncio.run(coroutine_fn())), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f'event loop still blocked after {timeout}s'
+    return results[0]
@@ -0,0 +1,62 @@
+from app import Author, Genre
+
+from conftest import add_book, add_named
+
+
+def test_fields_projects_columns_and_always_keeps_the_id(app, catalog, client):
+    add_named(Author, 'Ann')
+
+    data = client.get('/api/v1/authors?fields=name').get_json()['data']
+
+    assert data == [{'id': data[0]['id'], 'name': 'Ann'}]
+
+
+def test_relations_are_batch_loaded_whatever_the_page_size(app, catalog, client, statements):
+    author = add_named(Author, 'Ann')
+    genre = add_named(Genre, 'Essays')
+    for n in range(5):
+        add_book(f'Book {n}', authors=[author], genres=[genre])
+
+    counts = []
+    for limit in (1, 5):
+        statements.clear()
+        data = client.get(f'/api/v1/books?fields=title,authors,genres&limit={limit}').get_json()['data']
+        counts.append(len(statements))
+        assert all(book['authors'] == [{'id': author, 'name': 'Ann'}] for book in data)
+    assert counts == [3, 3]  # the page, its authors, its genres
+
+
+def test_next_links_walk_every_row_once(app, catalog, client):
+    ids = [add_book(f'Book {n}') for n in range(5)]
+
+    seen = []
+    url = '/api/v1/books?fields=id&limit=2'
+    while url:
+        body = client.get(url).get_json()
+        seen += [item['id'] for item in body['data']]
+        url = body['next']
+
+    assert seen == ids
+
+
+def test_ids_fetch_a_batch_in_one_request(app, catalog, client):
+    ids = [add_book(f'Book {n}') for n in range(3)]
+
+    data = client.get(f'/api/v1/books?ids={ids[2]},{ids[0]},999999').get_json()['data']
+
+    assert [item['id'] for item in data] == [ids[0], ids[2]]
+
+
+def test_bad_requests_are_reported_as_json(app, catalog, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'API_MAX_PER_PAGE', 2)
+    cases = {
+        '/api/v1/books?fields=title,secret': 400,
+        '/api/v1/books?ids=1,two': 400,
+        '/api/v1/books?ids=1,2,3': 400,
+        '/api/v1/loans': 404,
+        '/api/v1/books/999999': 404,
+    }
+    for url, status in cases.items():
+        response = client.get(url)
+        assert response.status_code == status, url
+        assert 'error' in response.get_json()
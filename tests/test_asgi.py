@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete, event, select
+
+from app import Genre, Author, catalog_stats, db
+from conftest import add_book, add_named, asgi_request, run_async
+
+FORM = (('Content-Type', 'application/x-www-form-urlencoded'),)
+
+
+@pytest.fixture
+def asgi_module(app):
+    # Imported after the session app is configured: asgi calls create_app()
+    pytest.importorskip('aiosqlite')
+    import asgi
+    return asgi
+
+
+@pytest.fixture
+def book(app, catalog):
+    author = add_named(Author, 'Ursula Le Guin')
+    genre = add_named(Genre, 'Fantasy')
+    return add_book('A Wizard of Earthsea', authors=[author], genres=[genre])
+
+
+def requests_for(book_id):
+    # One request per ASYNC_VIEWS entry and method: (endpoint, method, path, body, headers)
+    return [
+        ('index', 'GET', '/', b'', ()),
+        ('index', 'HEAD', '/', b'', ()),
+        ('search_books', 'GET', '/book/search', b'', ()),
+        ('search_books', 'POST', '/book/search', b'search_term=earthsea', FORM),
+        ('book_details', 'GET', f'/book/details/{book_id}', b'', ()),
+        ('book_details', 'HEAD', f'/book/details/{book_id}', b'', ()),
+        ('books_by_genre', 'GET', '/reports/books_by_genre', b'', ()),
+        ('authors_by_books', 'GET', '/reports/authors_by_books', b'', ()),
+    ]
+
+
+def test_requests_cover_every_async_view(asgi_module, book):
+    assert {endpoint for endpoint, *_ in requests_for(book)} == set(asgi_module.ASYNC_VIEWS)
+
+
+@pytest.mark.parametrize('index', range(8))
+def test_async_view_matches_wsgi_view(app, asgi_module, book, client, index):
+    endpoint, method, path, body, headers = requests_for(book)[index]
+
+    status, _, content = run_async(lambda: asgi_request(asgi_module.application, method, path, body=body, headers=headers))
+    expected = client.open(path, method=method, data=body, headers=dict(headers))
+
+    assert status == expected.status_code == 200
+    if method == 'HEAD':
+        assert content == b''
+    else:
+        assert content == expected.data
+
+
+def test_async_views_serve_concurrent_requests(app, asgi_module, book):
+    requests = requests_for(book) * 3
+
+    async def all_views_at_once():
+        return await asyncio.gather(*(
+            asgi_request(asgi_module.application, method, path, body=body, headers=headers)
+            for _, method, path, body, headers in requests
+        ))
+
+    responses = run_async(all_views_at_once)
+
+    assert [status for status, _, _ in responses] == [200] * len(requests)
+    for (endpoint, method, *_), (_, _, body) in zip(requests, responses):
+        if endpoint in ('index', 'book_details') and method == 'GET':
+            assert b'Earthsea' in body
+
+
+def test_conditional_get_through_the_async_index(app, asgi_module, book):
+    _, headers, _ = run_async(lambda: asgi_request(asgi_module.application, 'GET', '/'))
+    status, _, content = run_async(lambda: asgi_request(asgi_module.application, 'GET', '/',
+                                                        headers=[('If-None-Match', headers['etag'])]))
+    assert (status, content) == (304, b'')
+
+
+def test_missing_counters_are_seeded_without_touching_the_sync_engine(app, asgi_module, book):
+    with app.app_context(), db.engine.begin() as conn:
+        conn.execute(delete(catalog_stats))
+        sync_engine = db.engine
+    sync_statements = []
+    listener = lambda *args: sync_statements.append(args[2])  # noqa: E731
+    event.listen(sync_engine, 'before_cursor_execute', listener)
+    try:
+        status, _, _ = run_async(lambda: asgi_request(asgi_module.application, 'GET', '/'))
+    finally:
+        event.remove(sync_engine, 'before_cursor_execute', listener)
+
+    assert status == 200
+    assert sync_statements == []
+    with app.app_context(), db.engine.connect() as conn:
+        assert conn.execute(select(catalog_stats.c.total_books)).scalar() == 1
@@ -0,0 +1,53 @@
+from app import Author, Genre
+
+from conftest import add_book, add_named
+
+
+def edit_form(title, authors=(), genres=()):
+    return {'title': title, 'isbn': f'isbn-{title}', 'publisher': '', 'publication_date': '',
+            'copies_available': '1', 'authors': [str(i) for i in authors], 'genres': [str(i) for i in genres]}
+
+
+def test_details_list_each_author_and_genre_once(app, catalog, client):
+    authors = [add_named(Author, 'Annabel Quill'), add_named(Author, 'Bertram Vale')]
+    genres = [add_named(Genre, 'Sonnets'), add_named(Genre, 'Travelogue')]
+    book = add_book('Mixed', authors=authors, genres=genres)
+
+    page = client.get(f'/book/details/{book}').get_data(as_text=True)
+
+    # Aggregated in subqueries, so two authors x two genres never multiply
+    assert page.count('Annabel Quill') == page.count('Bertram Vale') == 1
+    assert page.count('Sonnets') == page.count('Travelogue') == 1
+
+
+def test_repeat_views_come_from_the_cache_and_revalidate(app, catalog, client, statements):
+    book = add_book('Cached')
+    first = client.get(f'/book/details/{book}')
+
+    statements.clear()
+    again = client.get(f'/book/details/{book}')
+    assert again.data == first.data
+    assert len(statements) == 1  # the version lookup only
+
+    not_modified = client.get(f'/book/details/{book}', headers={'If-None-Match': first.headers['ETag']})
+    assert not_modified.status_code == 304 and not_modified.data == b''
+
+
+def test_edits_and_renames_change_the_page_and_its_etag(app, catalog, client):
+    author = add_named(Author, 'Old Name')
+    book = add_book('Before', authors=[author])
+    before = client.get(f'/book/details/{book}')
+
+    client.post(f'/book/edit/{book}', data=edit_form('After', [author]))
+    edited = client.get(f'/book/details/{book}', headers={'If-None-Match': before.headers['ETag']})
+    assert edited.status_code == 200 and b'After' in edited.data
+
+    client.post(f'/author/edit/{author}', data={'name': 'New Name', 'biography': ''})
+    renamed = client.get(f'/book/details/{book}', headers={'If-None-Match': edited.headers['ETag']})
+    assert renamed.status_code == 200 and b'New Name' in renamed.data
+
+
+def test_missing_book_redirects_to_the_list(app, catalog, client):
+    response = client.get('/book/details/999999')
+
+    assert response.status_code == 302
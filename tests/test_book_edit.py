@@ -0,0 +1,45 @@
+from sqlalchemy import select
+
+from app import Author, Genre, book_authors, book_genres, db
+
+from conftest import add_book, add_named
+
+
+def association_ids(app, book_id):
+    with app.app_context(), db.engine.connect() as conn:
+        authors = conn.execute(select(book_authors.c.author_id).where(book_authors.c.book_id == book_id))
+        genres = conn.execute(select(book_genres.c.genre_id).where(book_genres.c.book_id == book_id))
+        return set(authors.scalars()), set(genres.scalars())
+
+
+def edit_form(title, authors, genres):
+    return {'title': title, 'isbn': f'isbn-{title}', 'publisher': '', 'publication_date': '',
+            'copies_available': '1', 'authors': [str(i) for i in authors], 'genres': [str(i) for i in genres]}
+
+
+def test_edit_writes_only_the_changed_associations(app, catalog, client, statements):
+    kept, dropped, added = (add_named(Author, name) for name in ('Kept', 'Dropped', 'Added'))
+    genre = add_named(Genre, 'Unchanged')
+    book = add_book('Edited', authors=[kept, dropped], genres=[genre])
+
+    statements.clear()
+    response = client.post(f'/book/edit/{book}', data=edit_form('Edited', [kept, added], [genre]))
+
+    issued = list(statements)
+
+    assert response.status_code == 302
+    assert association_ids(app, book) == ({kept, added}, {genre})
+    writes = [s.split()[:3] for s in issued if s.startswith(('INSERT INTO book_', 'DELETE FROM book_'))]
+    assert writes == [['DELETE', 'FROM', 'book_authors'], ['INSERT', 'INTO', 'book_authors']]
+    # The stored ids come from the loaded book, not a second query per table
+    assert not [s for s in issued if s.startswith(('SELECT book_authors.author_id', 'SELECT book_genres.genre_id'))]
+
+
+def test_edit_clears_every_association(app, catalog, client):
+    author = add_named(Author, 'Gone')
+    genre = add_named(Genre, 'Gone too')
+    book = add_book('Bare', authors=[author], genres=[genre])
+
+    client.post(f'/book/edit/{book}', data=edit_form('Bare', [], []))
+
+    assert association_ids(app, book) == (set(), set())
@@ -0,0 +1,50 @@
+# The book list costs a fixed number of statements whatever the page size:
+# authors, genres and publishers are batch-loaded, never per row.
+import pytest
+
+import app as app_module
+from app import Author, Genre, Publisher, db
+
+from conftest import add_book, add_named
+
+# Catalog version (page cache check), the page, its authors, its genres, the
+# catalog counters and the catalog version again (facet index check). Facet
+# counts come from the in-memory index.
+INDEX_STATEMENTS = 6
+
+
+@pytest.fixture
+def catalog_200(app, catalog, monkeypatch):
+    monkeypatch.setattr(app_module.page_cache, 'max_entries', 0)
+    author = add_named(Author, 'Author')
+    genre = add_named(Genre, 'Genre')
+    publisher = add_named(Publisher, 'Publisher')
+    for n in range(200):
+        add_book(f'Book {n:03}', authors=[author], genres=[genre], publisher_id=publisher)
+
+
+def count_statements(client, statements, url):
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    response.get_data()  # drain streamed pages
+    return len(statements)
+
+
+def test_index_statement_count_does_not_grow_with_page_size(client, catalog_200, statements):
+    client.get('/')  # builds the facet index
+    counts = {rows: count_statements(client, statements, f'/?per_page={rows}') for rows in (5, 50, 200)}
+
+    assert counts == {5: INDEX_STATEMENTS, 50: INDEX_STATEMENTS, 200: INDEX_STATEMENTS}
+
+
+@pytest.mark.parametrize('rows', [5, 50, 200])
+def test_load_book_list_issues_two_statements(app, catalog_200, statements, rows):
+    with app.app_context(), db.engine.connect() as conn:
+        page, _, _ = app_module.fetch_book_page(conn, after=None, before=None, per_page=rows)
+        statements.clear()
+        books = app_module.load_book_list(conn, page)
+
+    assert len(books) == rows
+    assert all(book['authors'] and book['genres'] and book['publisher'] for book in books)
+    assert len(statements) == 2
@@ -0,0 +1,52 @@
+import re
+
+from sqlalchemy import delete, func, select, text
+
+from app import Author, Book, Genre, Publisher, catalog_stats, db, get_catalog_stats
+
+from conftest import add_book, add_named
+
+
+def stored_and_counted(app):
+    with app.app_context(), db.engine.connect() as conn:
+        stats = conn.execute(select(catalog_stats).where(catalog_stats.c.id == 1)).first()
+        counted = tuple(conn.execute(select(func.count()).select_from(model)).scalar()
+                        for model in (Book, Author, Genre, Publisher))
+    return (stats.total_books, stats.total_authors, stats.total_genres, stats.total_publishers), counted
+
+
+def test_triggers_keep_the_counters_in_step_with_writes(app, catalog, client):
+    assert stored_and_counted(app) == ((0, 0, 0, 0), (0, 0, 0, 0))
+
+    author = add_named(Author, 'Author')
+    add_named(Genre, 'Genre')
+    add_named(Publisher, 'Publisher')
+    book = add_book('Counted', authors=[author])
+    add_book('Also counted')
+    client.post(f'/book/delete/{book}')
+    with app.app_context(), db.engine.begin() as conn:
+        conn.execute(delete(Genre.__table__))
+
+    stored, counted = stored_and_counted(app)
+    assert stored == counted == (1, 1, 0, 1)
+
+
+def test_dashboard_shows_the_counters_without_counting(app, catalog, client, statements):
+    add_book('First')
+    add_book('Second')
+
+    statements.clear()
+    page = client.get('/').get_data(as_text=True)
+
+    assert re.search(r'Total Books</h5>\s*<p class="card-text">2</p>', page)
+    assert not [s for s in statements if 'COUNT(' in s.upper() and 'FROM book' in s and 'catalog_stats' not in s]
+
+
+def test_missing_counter_row_is_rebuilt_on_read(app, catalog):
+    add_book('Only')
+    with app.app_context(), db.engine.begin() as conn:
+        conn.execute(text('DELETE FROM catalog_stats'))
+
+    with app.app_context(), db.engine.connect() as conn:
+        assert get_catalog_stats(conn).total_books == 1
+    assert stored_and_counted(app)[0][0] == 1
@@ -0,0 +1,73 @@
+from sqlalchemy import func, select
+
+from app import Book, Loan, db
+
+from conftest import add_book
+
+
+def copies_and_loans(app):
+    with app.app_context(), db.engine.connect() as conn:
+        copies = dict(conn.execute(select(Book.title, Book.copies_available)).all())
+        loans = conn.execute(select(func.count()).select_from(Loan)).scalar()
+    return copies, loans
+
+
+def test_checkout_takes_every_copy_in_one_transaction(app, catalog, client):
+    first = add_book('First', copies=2)
+    second = add_book('Second', copies=1)
+
+    response = client.post('/api/v1/checkout', json={'book_ids': [first, first, second], 'borrower': 'ann'})
+
+    assert response.status_code == 201
+    assert sorted(loan['book_id'] for loan in response.get_json()['loans']) == sorted([first, first, second])
+    assert copies_and_loans(app) == ({'First': 0, 'Second': 0}, 3)
+
+
+def test_checkout_takes_nothing_when_one_book_is_out_of_stock(app, catalog, client):
+    first = add_book('First', copies=2)
+    second = add_book('Second', copies=0)
+
+    response = client.post('/api/v1/checkout', json={'book_ids': [first, second]})
+
+    assert response.status_code == 409
+    assert response.get_json()['unavailable'] == [second]
+    assert response.get_json()['missing'] == []
+    assert copies_and_loans(app) == ({'First': 2, 'Second': 0}, 0)
+
+
+def test_checkout_counts_repeated_ids_against_available_copies(app, catalog, client):
+    book = add_book('Only', copies=1)
+
+    response = client.post('/api/v1/checkout', json={'book_ids': [book, book]})
+
+    assert response.status_code == 409
+    assert copies_and_loans(app) == ({'Only': 1}, 0)
+
+
+def test_checkout_reports_unknown_books_as_missing(app, catalog, client):
+    book = add_book('Only', copies=0)
+
+    response = client.post('/api/v1/checkout', json={'book_ids': [book, 999999]})
+
+    assert response.status_code == 404
+    assert response.get_json()['missing'] == [999999]
+    assert response.get_json()['unavailable'] == [book]
+    assert copies_and_loans(app) == ({'Only': 0}, 0)
+
+
+def test_checkout_rejects_booleans_as_ids(app, catalog, client):
+    add_book('Only')
+
+    response = client.post('/api/v1/checkout', json={'book_ids': [True]})
+
+    assert response.status_code == 400
+
+
+def test_return_restocks_each_loan_once(app, catalog, client):
+    book = add_book('Only', copies=1)
+    loan_id = client.post('/api/v1/checkout', json={'book_ids': [book]}).get_json()['loans'][0]['id']
+
+    assert len(client.post('/api/v1/return', json={'loan_ids': [loan_id]}).get_json()['returned']) == 1
+    assert client.post('/api/v1/return', json={'loan_ids': [loan_id]}).get_json()['returned'] == []
+    assert copies_and_loans(app)[0] == {'Only': 1}
+
@@ -0,0 +1,59 @@
+import pytest
+
+from app import Genre
+
+from conftest import add_book, add_named
+
+LIST_PAGES = ['/', '/authors', '/publishers', '/genres']
+
+
+@pytest.mark.parametrize('path', LIST_PAGES)
+def test_list_pages_answer_revalidation_with_304(app, catalog, client, path):
+    first = client.get(path)
+    assert first.headers['ETag'] and first.headers['Last-Modified']
+    assert first.cache_control.no_cache
+
+    by_etag = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    by_date = client.get(path, headers={'If-Modified-Since': first.headers['Last-Modified']})
+
+    assert by_etag.status_code == by_date.status_code == 304
+    assert by_etag.data == b''
+
+
+def test_any_catalog_write_changes_the_validators(app, catalog, client):
+    before = client.get('/genres')
+
+    client.post('/genre/new', data={'name': 'New Wave', 'description': ''}, follow_redirects=True)
+    after = client.get('/genres', headers={'If-None-Match': before.headers['ETag']})
+
+    assert after.status_code == 200 and b'New Wave' in after.data
+    assert after.headers['ETag'] != before.headers['ETag']
+
+
+def test_rendered_pages_are_reused_until_the_version_changes(app, catalog, client, statements):
+    add_named(Genre, 'Cached')
+    client.get('/genres')
+
+    statements.clear()
+    client.get('/genres')
+    assert len(statements) == 1  # the catalog version check only
+
+    add_named(Genre, 'Fresh')
+    assert b'Fresh' in client.get('/genres').data
+
+
+def test_pages_with_pending_flashes_are_neither_cached_nor_validated(app, catalog, client):
+    book = add_book('Going')
+    client.post(f'/book/delete/{book}')  # flashes "Book deleted successfully!"
+
+    flashed = client.get('/')
+    assert b'deleted successfully' in flashed.data
+    assert 'ETag' not in flashed.headers
+    assert b'deleted successfully' not in client.get('/').data
+
+
+def test_query_arguments_get_their_own_cache_entries(app, catalog, client):
+    for title in ['A', 'B', 'C']:
+        add_book(title)
+
+    assert client.get('/?per_page=1').data != client.get('/?per_page=2').data
@@ -0,0 +1,47 @@
+import threading
+import time
+
+from sqlalchemy import text
+
+from app import Author, db
+
+from conftest import add_named
+
+EXPECTED_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 1,        # NORMAL
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'busy_timeout': 30000,
+    'temp_store': 2,         # MEMORY
+}
+
+
+def test_every_pooled_connection_gets_the_pragmas(app):
+    with app.app_context():
+        with db.engine.connect() as first, db.engine.connect() as second:
+            for conn in (first, second):
+                applied = {pragma: conn.exec_driver_sql(f'PRAGMA {pragma}').scalar() for pragma in EXPECTED_PRAGMAS}
+                assert applied == EXPECTED_PRAGMAS
+
+
+def test_writers_wait_for_the_lock_instead_of_failing(app, catalog):
+    holding = threading.Event()
+
+    def hold_write_lock():
+        with app.app_context(), db.engine.begin() as conn:
+            conn.execute(text("INSERT INTO author (name) VALUES ('Holder')"))
+            holding.set()
+            time.sleep(0.3)
+
+    holder = threading.Thread(target=hold_write_lock)
+    holder.start()
+    holding.wait(5)
+    started = time.perf_counter()
+    add_named(Author, 'Waiter')  # raises "database is locked" without busy_timeout
+    waited = time.perf_counter() - started
+    holder.join()
+
+    assert waited > 0.1
+    with app.app_context(), db.engine.connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*) FROM author')).scalar() == 2
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+import app as app_module
+from app import Genre
+
+from conftest import add_book, add_named, asgi_request, run_async
+
+
+def test_stale_facet_counts_are_not_cached_as_the_current_version(app, catalog, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'FACET_INDEX_MAX_STALENESS', 3600)
+    monkeypatch.setattr(app_module.page_cache, 'max_entries', 512)
+    genre_id = add_named(Genre, 'Poetry')
+    add_book('First', genres=[genre_id])
+    first = client.get('/')
+    assert first.headers.get('ETag')
+
+    # The facet index is recent enough to be reused, so its counts lag behind
+    add_book('Second', genres=[genre_id])
+    stale = client.get('/')
+    assert b'Second' in stale.data
+    assert 'ETag' not in stale.headers
+    assert 'Last-Modified' not in stale.headers
+    assert client.get('/', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+
+    # Once the index catches up, the page is cached and validated again
+    monkeypatch.setitem(app.config, 'FACET_INDEX_MAX_STALENESS', 0)
+    fresh = client.get('/')
+    assert fresh.headers.get('ETag') and fresh.headers['ETag'] != first.headers['ETag']
+    assert client.get('/', headers={'If-None-Match': fresh.headers['ETag']}).status_code == 304
+
+
+def test_concurrent_async_index_requests_share_a_cold_facet_index(app, catalog):
+    pytest.importorskip('aiosqlite')
+    import asgi
+
+    genre_id = add_named(Genre, 'Poetry')
+    add_book('First', genres=[genre_id])
+
+    async def concurrent_requests():
+        return await asyncio.gather(*(asgi_request(asgi.application, 'GET', '/') for _ in range(4)))
+
+    responses = run_async(concurrent_requests)
+
+    assert [status for status, _, _ in responses] == [200] * 4
+    assert all(b'First' in body for _, _, body in responses)
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+import app as app_module
+from app import Book, db, import_books_file
+
+
+def write_csv(path, *rows):
+    path.write_text('title,isbn,publication_date,copies_available,authors\n' + ''.join(row + '\n' for row in rows))
+    return str(path)
+
+
+def stored_books(app):
+    with app.app_context(), db.engine.connect() as conn:
+        return dict(conn.execute(select(Book.isbn, Book.title)).all())
+
+
+def test_invalid_rows_are_rejected_and_the_rest_imported(app, catalog, tmp_path):
+    source = write_csv(
+        tmp_path / 'books.csv',
+        'Good,isbn-good,2001-02-03,2,Ann',
+        'Short row',                       # no isbn column at all
+        ',isbn-untitled,,,',               # empty title
+        'Bad date,isbn-date,03/02/2001,,',
+        'Bad copies,isbn-copies,,many,',
+        'Also good,isbn-also,,,',
+    )
+
+    with app.app_context():
+        imported, rejected, _ = import_books_file(source)
+
+    assert (imported, rejected) == (2, 4)
+    assert stored_books(app) == {'isbn-good': 'Good', 'isbn-also': 'Also good'}
+
+
+def test_jsonl_records_need_string_title_and_isbn(app, catalog, tmp_path):
+    source = tmp_path / 'books.jsonl'
+    source.write_text('\n'.join(json.dumps(record) for record in [
+        {'title': 'Good', 'isbn': 'isbn-good'},
+        {'title': 'No isbn'},
+        {'title': None, 'isbn': 'isbn-none'},
+        ['not', 'an', 'object'],
+    ]))
+
+    with app.app_context():
+        imported, rejected, _ = import_books_file(str(source))
+
+    assert (imported, rejected) == (1, 3)
+    assert stored_books(app) == {'isbn-good': 'Good'}
+
+
+def test_failed_import_resumes_from_its_checkpoint(app, catalog, tmp_path, monkeypatch):
+    source = write_csv(tmp_path / 'books.csv', 'One,isbn-1,,,', 'Bad,,,,', 'Two,isbn-2,,,', 'Three,isbn-3,,,')
+    checkpoint = source + '.checkpoint'
+    real_import_batch = app_module.import_batch
+
+    def failing_import_batch(conn, batch, lookups, touched):
+        if batch[0]['isbn'] == 'isbn-3':
+            raise RuntimeError('disk full')
+        return real_import_batch(conn, batch, lookups, touched)
+
+    monkeypatch.setattr(app_module, 'import_batch', failing_import_batch)
+    with app.app_context(), pytest.raises(RuntimeError):
+        import_books_file(source, batch_size=1)
+    with open(checkpoint, encoding='utf-8') as fh:
+        assert json.load(fh)['records_done'] == 3
+
+    monkeypatch.setattr(app_module, 'import_batch', real_import_batch)
+    with app.app_context():
+        imported, rejected, _ = import_books_file(source, batch_size=1)
+
+    # Only the record after the checkpoint is imported; the earlier rejection is carried over
+    assert (imported, rejected) == (1, 1)
+    assert set(stored_books(app)) == {'isbn-1', 'isbn-2', 'isbn-3'}
+    assert not (tmp_path / 'books.csv.checkpoint').exists()
+
+
+def test_checkpoint_for_another_file_is_ignored(app, catalog, tmp_path):
+    source = write_csv(tmp_path / 'books.csv', 'One,isbn-1,,,', 'Two,isbn-2,,,')
+    checkpoint = tmp_path / 'shared.checkpoint'
+    checkpoint.write_text(json.dumps({'source': str(tmp_path / 'other.csv'), 'records_done': 1, 'rejected': 0}))
+
+    with app.app_context():
+        imported, _, _ = import_books_file(source, checkpoint=str(checkpoint))
+
+    assert imported == 2
+    assert set(stored_books(app)) == {'isbn-1', 'isbn-2'}
@@ -0,0 +1,18 @@
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+
+def test_failing_statements_leave_no_timing_state_on_the_connection(app, catalog):
+    with app.test_request_context(), db.engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM no_such_table'))
+            conn.rollback()
+        conn.execute(text('SELECT 1'))
+
+        assert not any(isinstance(value, list) for value in conn.info.values())
+        assert g.sql_count == 1
@@ -0,0 +1,46 @@
+import time
+
+from sqlalchemy import select
+
+import app as app_module
+from app import Job, claim_job, db, enqueue_job, run_job
+
+
+def queue_and_claim(app, kind, worker):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            enqueue_job(conn, kind)
+        with db.engine.begin() as conn:
+            return claim_job(conn, worker)
+
+
+def test_heartbeat_keeps_the_lease_of_a_job_that_reports_no_progress(app, catalog, monkeypatch):
+    monkeypatch.setitem(app.config, 'JOB_LEASE_TIMEOUT', 0.3)
+    monkeypatch.setitem(app.config, 'JOB_HEARTBEAT_INTERVAL', 0.05)
+    claimed_by_other = []
+
+    def slow_handler(params, progress):
+        time.sleep(0.6)
+        with db.engine.begin() as conn:
+            claimed_by_other.append(claim_job(conn, 'other'))
+
+    monkeypatch.setitem(app_module.JOB_HANDLERS, 'analyze', slow_handler)
+    job = queue_and_claim(app, 'analyze', 'first')
+    with app.app_context():
+        run_job(job, 'first')
+        with db.engine.connect() as conn:
+            status, attempts = conn.execute(select(Job.status, Job.attempts).where(Job.id == job.id)).one()
+
+    assert claimed_by_other == [None]
+    assert (status, attempts) == ('succeeded', 1)
+
+
+def test_job_without_heartbeat_is_reclaimed_after_the_lease(app, catalog, monkeypatch):
+    monkeypatch.setitem(app.config, 'JOB_LEASE_TIMEOUT', 0.1)
+    job = queue_and_claim(app, 'analyze', 'crashed')
+
+    time.sleep(0.2)
+    with app.app_context(), db.engine.begin() as conn:
+        reclaimed = claim_job(conn, 'other')
+
+    assert (reclaimed.id, reclaimed.attempts) == (job.id, 2)
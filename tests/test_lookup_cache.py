@@ -0,0 +1,89 @@
+import app as app_module
+from app import Author, LookupCache, bump_cache_version, db, get_lookup_list
+
+from conftest import add_named
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def counting_loader(value):
+    calls = []
+
+    def load():
+        calls.append(value)
+        return value
+    return load, calls
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app_module.time, 'monotonic', clock)
+    cache = LookupCache(ttl=10, max_entries=4)
+    load, calls = counting_loader('rows')
+
+    cache.get('authors', load)
+    clock.now += 9
+    cache.get('authors', load)
+    assert calls == ['rows']
+    clock.now += 2
+    cache.get('authors', load)
+    assert calls == ['rows', 'rows']
+
+
+def test_least_recently_used_entry_is_dropped_first():
+    cache = LookupCache(ttl=60, max_entries=2)
+    loads = []
+    for key in ['a', 'b', 'a', 'c', 'a', 'b']:
+        cache.get(key, lambda key=key: loads.append(key) or key)
+
+    # 'b' was evicted by 'c' because 'a' had just been used
+    assert loads == ['a', 'b', 'c', 'b']
+
+
+def test_a_different_version_or_an_unstorable_value_is_a_miss():
+    cache = LookupCache(ttl=60, max_entries=4)
+    load, calls = counting_loader('rows')
+
+    cache.get('authors', load, version=1)
+    cache.get('authors', load, version=1)
+    cache.get('authors', load, version=2)
+    assert len(calls) == 2
+
+    empty, empty_calls = counting_loader([])
+    cache.get('genres', empty, should_store=bool)
+    cache.get('genres', empty, should_store=bool)
+    assert len(empty_calls) == 2
+
+
+def test_lookup_list_is_cached_until_a_write_invalidates_it(app, catalog, client):
+    add_named(Author, 'First')
+    with app.test_request_context():
+        assert [row.name for row in get_lookup_list('author')] == ['First']
+
+    add_named(Author, 'Behind the cache')  # not through a route, so not invalidated
+    with app.test_request_context():
+        assert [row.name for row in get_lookup_list('author')] == ['First']
+
+    client.post('/author/new', data={'name': 'Second', 'biography': ''})
+    with app.test_request_context():
+        assert [row.name for row in get_lookup_list('author')] == ['Behind the cache', 'First', 'Second']
+
+
+def test_shared_mode_follows_invalidations_from_other_workers(app, catalog, monkeypatch):
+    monkeypatch.setitem(app.config, 'LOOKUP_CACHE_SHARED', True)
+    add_named(Author, 'First')
+    with app.test_request_context():
+        get_lookup_list('author')
+    add_named(Author, 'Second')
+
+    # Another worker process bumps the shared version after its write
+    with app.app_context(), db.engine.begin() as conn:
+        bump_cache_version(conn, 'lookup:author')
+    with app.test_request_context():
+        assert [row.name for row in get_lookup_list('author')] == ['First', 'Second']
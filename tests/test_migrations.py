@@ -0,0 +1,138 @@
+# Upgrading a database created by the original app (catalog tables only) must
+# end with the full schema, whichever of db-upgrade / init-db runs first.
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Schema of the shipped instance/library.db
+BASELINE_DDL = """
+CREATE TABLE author (id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, biography TEXT, PRIMARY KEY (id));
+CREATE TABLE genre (id INTEGER NOT NULL, name VARCHAR(50) NOT NULL, description TEXT, PRIMARY KEY (id));
+CREATE TABLE publisher (id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, address VARCHAR(200),
+    contact VARCHAR(100), PRIMARY KEY (id));
+CREATE TABLE book (id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, isbn VARCHAR(20) NOT NULL,
+    publication_date DATE, copies_available INTEGER, publisher_id INTEGER, PRIMARY KEY (id), UNIQUE (isbn),
+    FOREIGN KEY(publisher_id) REFERENCES publisher (id));
+CREATE TABLE book_authors (book_id INTEGER NOT NULL, author_id INTEGER NOT NULL, PRIMARY KEY (book_id, author_id),
+    FOREIGN KEY(book_id) REFERENCES book (id), FOREIGN KEY(author_id) REFERENCES author (id));
+CREATE TABLE book_genres (book_id INTEGER NOT NULL, genre_id INTEGER NOT NULL, PRIMARY KEY (book_id, genre_id),
+    FOREIGN KEY(book_id) REFERENCES book (id), FOREIGN KEY(genre_id) REFERENCES genre (id));
+INSERT INTO author VALUES (1, 'George Orwell', NULL);
+INSERT INTO genre VALUES (1, 'Classic', NULL);
+INSERT INTO publisher VALUES (1, 'Penguin', NULL, NULL);
+INSERT INTO book VALUES (1, 'Nineteen Eighty-Four', '9780451524935', '1949-06-08', 3, 1);
+INSERT INTO book_authors VALUES (1, 1);
+INSERT INTO book_genres VALUES (1, 1);
+"""
+
+# Requests every page that depends on a derived table
+CHECK_SCRIPT = """
+import json
+from app import create_app
+app = create_app({'METRICS_ENABLED': False})
+client = app.test_client()
+statuses = {url: client.get(url).status_code
+            for url in ['/', '/authors', '/reports/books_by_genre', '/book/details/1']}
+statuses['search'] = client.post('/book/search', data={'search_term': 'orwell'}).status_code
+print(json.dumps(statuses))
+"""
+
+
+@pytest.fixture
+def baseline_env(tmp_path):
+    path = tmp_path / 'library.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_DDL)
+    return dict(os.environ, BOOKMANAGER_DATABASE_URI=f'sqlite:///{path}', FLASK_APP='app')
+
+
+def flask(env, *args):
+    result = subprocess.run([sys.executable, '-m', 'flask', *args], cwd=REPO_ROOT, env=env,
+                            check=True, capture_output=True, text=True)
+    return result.stdout
+
+
+def page_statuses(env):
+    result = subprocess.run([sys.executable, '-c', CHECK_SCRIPT], cwd=REPO_ROOT, env=env,
+                            check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize('commands', [['db-upgrade'], ['db-upgrade', 'init-db'], ['init-db']])
+def test_baseline_database_upgrades_to_full_schema(baseline_env, commands):
+    for command in commands:
+        flask(baseline_env, command)
+
+    assert 'Schema is at version' in flask(baseline_env, 'db-upgrade')
+    assert set(page_statuses(baseline_env).values()) == {200}
+
+
+def test_upgrade_keeps_existing_rows_and_fills_derived_tables(baseline_env):
+    flask(baseline_env, 'db-upgrade')
+
+    path = baseline_env['BOOKMANAGER_DATABASE_URI'][len('sqlite:///'):]
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT title FROM book').fetchall() == [('Nineteen Eighty-Four',)]
+        assert conn.execute('SELECT total_books FROM catalog_stats').fetchone() == (1,)
+        assert conn.execute("SELECT rowid FROM book_fts WHERE book_fts MATCH 'orwell'").fetchall() == [(1,)]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'catalog_version', 'cache_versions', 'loan', 'job', 'genre_book_counts'} <= tables
+
+
+def test_uninitialized_database_is_left_to_init_db(tmp_path):
+    env = dict(os.environ, BOOKMANAGER_DATABASE_URI=f"sqlite:///{tmp_path / 'empty.db'}", FLASK_APP='app')
+    assert 'run `flask init-db`' in flask(env, 'db-upgrade')
+
+
+@pytest.fixture
+def populated_env(baseline_env):
+    # Enough rows that the planner's statistics (ANALYZE runs in migration 1)
+    # favour the indexes, as they would on a real catalog
+    path = baseline_env['BOOKMANAGER_DATABASE_URI'][len('sqlite:///'):]
+    with sqlite3.connect(path) as conn:
+        conn.executemany('INSERT INTO author (name) VALUES (?)', [(f'Author {n}',) for n in range(500)])
+        conn.executemany('INSERT INTO genre (name) VALUES (?)', [(f'Genre {n}',) for n in range(40)])
+        conn.executemany('INSERT INTO publisher (name) VALUES (?)', [(f'Publisher {n}',) for n in range(50)])
+        conn.executemany('INSERT INTO book (title, isbn, copies_available, publisher_id) VALUES (?, ?, 1, ?)',
+                         [(f'Book {n}', f'isbn-{n}', n % 50 + 1) for n in range(3000)])
+        conn.executemany('INSERT OR IGNORE INTO book_authors VALUES (?, ?)',
+                         [(n % 3000 + 1, n * 7 % 500 + 1) for n in range(6000)])
+        conn.executemany('INSERT OR IGNORE INTO book_genres VALUES (?, ?)',
+                         [(n % 3000 + 1, n * 3 % 40 + 1) for n in range(6000)])
+    return baseline_env
+
+
+REVERSE_LOOKUPS = {
+    'SELECT COUNT(*) FROM book_authors WHERE author_id = 1': 'ix_book_authors_author_id',
+    'SELECT COUNT(*) FROM book_genres WHERE genre_id = 1': 'ix_book_genres_genre_id',
+    'SELECT id FROM book WHERE publisher_id = 1': 'ix_book_publisher_id',
+}
+
+
+def test_reverse_association_lookups_use_the_new_indexes(populated_env):
+    assert 'Applied migration 1' in flask(populated_env, 'db-upgrade')
+    assert 'Applied migration' not in flask(populated_env, 'db-upgrade')  # nothing left to apply
+
+    path = populated_env['BOOKMANAGER_DATABASE_URI'][len('sqlite:///'):]
+    with sqlite3.connect(path) as conn:
+        for query, index in REVERSE_LOOKUPS.items():
+            plan = ' '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + query))
+            assert index in plan, plan
+
+
+def test_explain_routes_reports_indexed_delete_guards(populated_env):
+    flask(populated_env, 'db-upgrade')
+
+    output = flask(populated_env, 'explain-routes', '--all')
+
+    blocks = output.split('\n[')
+    for endpoint, index in [('delete_author', 'ix_book_authors_author_id'), ('delete_genre', 'ix_book_genres_genre_id')]:
+        guard = next(block for block in blocks if block.startswith(f'{endpoint}] SELECT COUNT(*)'))
+        assert index in guard and '!!' not in guard
+    assert output.rstrip().endswith('full table scan(s).')
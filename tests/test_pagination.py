@@ -0,0 +1,62 @@
+from app import db, decode_cursor, encode_cursor, fetch_book_page
+
+from conftest import add_book
+
+
+def titles(rows):
+    return [row.title for row in rows]
+
+
+def test_pages_cover_every_book_once_with_ties_broken_by_id(app, catalog):
+    for n, title in enumerate(['Beta', 'Alpha', 'Beta', 'Gamma', 'Beta']):
+        add_book(title, isbn=f'isbn-{n}')
+
+    pages = []
+    with app.app_context(), db.engine.connect() as conn:
+        rows, next_cursor, _ = fetch_book_page(conn, per_page=2)
+        pages.append(titles(rows))
+        while next_cursor:
+            rows, next_cursor, prev_cursor = fetch_book_page(conn, after=decode_cursor(next_cursor), per_page=2)
+            pages.append(titles(rows))
+        # And back again from the last page
+        back = []
+        while prev_cursor:
+            rows, _, prev_cursor = fetch_book_page(conn, before=decode_cursor(prev_cursor), per_page=2)
+            back.insert(0, titles(rows))
+
+    assert pages == [['Alpha', 'Beta'], ['Beta', 'Beta'], ['Gamma']]
+    assert back == pages[:-1]
+
+
+def test_first_and_last_pages_have_no_outward_cursor(app, catalog):
+    for title in ['A', 'B', 'C']:
+        add_book(title)
+
+    with app.app_context(), db.engine.connect() as conn:
+        first, next_cursor, prev_cursor = fetch_book_page(conn, per_page=2)
+        assert prev_cursor is None and next_cursor is not None
+        last, next_cursor, prev_cursor = fetch_book_page(conn, after=decode_cursor(next_cursor), per_page=2)
+        assert [row.title for row in last] == ['C']
+        assert next_cursor is None and prev_cursor is not None
+        exact, next_cursor, _ = fetch_book_page(conn, per_page=3)
+        assert len(exact) == 3 and next_cursor is None
+
+
+def test_empty_catalog_has_no_cursors(app, catalog):
+    with app.app_context(), db.engine.connect() as conn:
+        assert fetch_book_page(conn, per_page=10) == ([], None, None)
+
+
+def test_cursor_round_trip_and_malformed_cursors(app):
+    assert decode_cursor(encode_cursor('Ünïcode, "quoted"', 7)) == ('Ünïcode, "quoted"', 7)
+    for token in ['', 'not base64!', encode_cursor('title', 'id'), 'WzFd']:
+        assert decode_cursor(token) is None
+
+
+def test_index_ignores_a_malformed_cursor(app, catalog, client):
+    add_book('Only Book')
+
+    response = client.get('/?after=garbage')
+
+    assert response.status_code == 200
+    assert b'Only Book' in response.data
@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+from app import Author, db, get_read_engine
+
+from conftest import add_named
+
+
+@pytest.fixture
+def engine_statements(app):
+    # Statements issued per engine: {'primary': [...], 'read': [...]}
+    with app.app_context():
+        engines = {'primary': db.engine, 'read': get_read_engine()}
+    assert engines['primary'] is not engines['read']
+    issued = {name: [] for name in engines}
+    listeners = {}
+    for name, engine in engines.items():
+        listeners[name] = lambda conn, cursor, statement, *args, name=name: issued[name].append(statement)
+        event.listen(engine, 'before_cursor_execute', listeners[name])
+    yield issued
+    for name, engine in engines.items():
+        event.remove(engine, 'before_cursor_execute', listeners[name])
+
+
+def clear(issued):
+    for statements in issued.values():
+        statements.clear()
+
+
+def test_read_only_routes_use_the_read_engine(app, catalog, client, engine_statements):
+    add_named(Author, 'Reader')
+    clear(engine_statements)
+
+    for url in ['/', '/authors', '/genres', '/reports/books_by_genre']:
+        assert client.get(url).status_code == 200
+
+    assert engine_statements['read'] and not engine_statements['primary']
+
+
+def test_other_routes_stay_on_the_primary(app, catalog, client, engine_statements):
+    author = add_named(Author, 'Editor')
+    clear(engine_statements)
+
+    client.get(f'/author/edit/{author}')
+
+    assert engine_statements['primary'] and not engine_statements['read']
+
+
+def test_the_page_after_a_write_reads_from_the_primary(app, catalog, client, engine_statements):
+    client.post('/author/new', data={'name': 'Fresh', 'biography': ''})
+    clear(engine_statements)
+
+    assert b'Fresh' in client.get('/authors').data
+    assert engine_statements['primary'] and not engine_statements['read']
+
+    clear(engine_statements)
+    client.get('/authors')
+    assert engine_statements['read'] and not engine_statements['primary']
+
+
+def test_routing_can_be_switched_off(app, catalog, client, engine_statements, monkeypatch):
+    monkeypatch.setitem(app.config, 'READ_ROUTING_ENABLED', False)
+
+    client.get('/authors')
+
+    assert engine_statements['primary'] and not engine_statements['read']
+
+
+def test_read_engine_refuses_writes(app, catalog):
+    with app.app_context(), get_read_engine().connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("INSERT INTO author (name) VALUES ('Sneaky')"))
@@ -0,0 +1,58 @@
+from sqlalchemy import text
+
+from app import Author, Genre, db, fetch_report_page, rebuild_report_tables
+
+from conftest import add_book, add_named
+
+SUMMARIES = "SELECT 'genre', genre_id, book_count FROM genre_book_counts " \
+            "UNION ALL SELECT 'author', author_id, book_count FROM author_book_counts ORDER BY 1, 2"
+
+
+def summaries(app, rebuilt=False):
+    # The maintained rows, or what a full rebuild would produce (rolled back)
+    with app.app_context(), db.engine.connect() as conn:
+        with conn.begin() as transaction:
+            if rebuilt:
+                rebuild_report_tables(conn)
+            rows = conn.execute(text(SUMMARIES)).all()
+            transaction.rollback()
+    return rows
+
+
+def edit_form(title, authors=(), genres=()):
+    return {'title': title, 'isbn': f'isbn-{title}', 'publisher': '', 'publication_date': '',
+            'copies_available': '1', 'authors': [str(i) for i in authors], 'genres': [str(i) for i in genres]}
+
+
+def test_triggers_keep_the_summaries_equal_to_a_rebuild(app, catalog, client):
+    poetry, prose = add_named(Genre, 'Poetry'), add_named(Genre, 'Prose')
+    ann, bo = add_named(Author, 'Ann'), add_named(Author, 'Bo')
+    first = add_book('First', authors=[ann, bo], genres=[poetry])
+    second = add_book('Second', authors=[ann], genres=[poetry, prose])
+    add_book('Third', authors=[bo], genres=[prose])
+
+    client.post(f'/book/edit/{first}', data=edit_form('First', [bo], [prose]))
+    client.post(f'/book/delete/{second}')
+    client.post(f'/author/delete/{ann}')
+    client.post('/genre/new', data={'name': 'Drama', 'description': ''})
+
+    assert summaries(app) == summaries(app, rebuilt=True)
+    rows = summaries(app)
+    assert ('genre', prose, 2) in rows and ('genre', poetry, 0) in rows
+    assert [row for row in rows if row[0] == 'author'] == [('author', bo, 2)]
+    assert len(rows) == 4  # Drama starts at zero
+
+
+def test_report_pages_read_the_summaries(app, catalog, client):
+    poetry, prose = add_named(Genre, 'Poetry'), add_named(Genre, 'Prose')
+    add_book('First', genres=[poetry])
+    add_book('Second', genres=[poetry, prose])
+
+    with app.app_context(), db.engine.connect() as conn:
+        rows, as_of = fetch_report_page(conn, 'books_by_genre', 10, 0)
+    assert [tuple(row) for row in rows] == [('Poetry', 2), ('Prose', 1)]
+    assert as_of is not None
+
+    page = client.get('/reports/books_by_genre?top=1').get_data(as_text=True)
+    assert 'Poetry' in page and 'Prose' not in page
+    assert client.get('/reports/authors_by_books').status_code == 200
@@ -0,0 +1,94 @@
+from sqlalchemy import select, text
+
+from app import Author, Book, Genre, catalog_version, db, import_books_file, rebuild_search_index
+
+from conftest import add_book, add_named
+
+
+def indexed_documents(app):
+    with app.app_context(), db.engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT rowid, title, authors, genres FROM book_fts ORDER BY rowid"
+        )).all()
+
+
+def rebuilt_documents(app):
+    # What a full rebuild would store; rolled back so the live index is untouched
+    with app.app_context(), db.engine.connect() as conn:
+        with conn.begin() as transaction:
+            rebuild_search_index(conn)
+            documents = conn.execute(text(
+                "SELECT rowid, title, authors, genres FROM book_fts ORDER BY rowid"
+            )).all()
+            transaction.rollback()
+    return documents
+
+
+def catalog_version_now(app):
+    with app.app_context(), db.engine.connect() as conn:
+        return conn.execute(select(catalog_version.c.version)).scalar()
+
+
+def book_form(title, authors=(), genres=()):
+    return {'title': title, 'isbn': f'isbn-{title}', 'publisher': '', 'publication_date': '',
+            'copies_available': '1', 'authors': [str(i) for i in authors], 'genres': [str(i) for i in genres]}
+
+
+def test_new_book_is_indexed_with_its_associations(app, catalog, client):
+    author = add_named(Author, 'Ursula Le Guin')
+    genre = add_named(Genre, 'Fantasy')
+
+    client.post('/book/new', data=book_form('Earthsea', [author], [genre]))
+
+    assert indexed_documents(app) == rebuilt_documents(app)
+    assert [(row.title, row.authors, row.genres) for row in indexed_documents(app)] == \
+        [('Earthsea', 'Ursula Le Guin', 'Fantasy')]
+
+
+def test_author_rename_reindexes_their_books(app, catalog, client):
+    author = add_named(Author, 'Old Name')
+    add_book('First', authors=[author])
+    add_book('Second', authors=[author])
+
+    client.post(f'/author/edit/{author}', data={'name': 'New Name', 'biography': ''})
+
+    assert indexed_documents(app) == rebuilt_documents(app)
+    assert {row.authors for row in indexed_documents(app)} == {'New Name'}
+
+
+def test_removing_an_association_reindexes_the_book_once(app, catalog, client):
+    kept = add_named(Author, 'Kept Author')
+    removed = add_named(Author, 'Removed Author')
+    genre = add_named(Genre, 'Poetry')
+    book = add_book('Verses', authors=[kept, removed])
+    version = catalog_version_now(app)
+
+    client.post(f'/book/edit/{book}', data=book_form('Verses', [kept], [genre]))
+
+    assert indexed_documents(app) == rebuilt_documents(app)
+    assert [(row.authors, row.genres) for row in indexed_documents(app)] == [('Kept Author', 'Poetry')]
+    # One bump for the whole edit, not one per changed row
+    assert catalog_version_now(app) == version + 1
+
+
+def test_imported_books_are_indexed(app, catalog, tmp_path):
+    source = tmp_path / 'books.csv'
+    source.write_text(
+        'title,isbn,authors,genres,publisher\n'
+        'Dune,isbn-dune,Frank Herbert,Science Fiction,Chilton\n'
+        'Emma,isbn-emma,Jane Austen;Frank Herbert,Romance,\n'
+    )
+    version = catalog_version_now(app)
+
+    with app.app_context():
+        imported, _, _ = import_books_file(str(source))
+
+    assert imported == 2
+    assert indexed_documents(app) == rebuilt_documents(app)
+    assert catalog_version_now(app) > version
+    with app.app_context(), db.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM trigger_suspend")).scalar() == 0
+        titles = conn.execute(
+            select(Book.title).where(Book.id.in_(text("SELECT rowid FROM book_fts WHERE book_fts MATCH 'herbert'")))
+        ).scalars().all()
+    assert sorted(titles) == ['Dune', 'Emma']
@@ -0,0 +1,143 @@
+import pytest
+from sqlalchemy import select
+
+import app as app_module
+from app import Genre, Job, db, job_worker_loop, use_tenant
+
+from conftest import add_book, add_named, asgi_request, run_async
+
+EAST = {'X-Library-Tenant': 'east'}
+
+
+@pytest.fixture
+def shards(app, catalog, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'SHARDING_ENABLED', True)
+    monkeypatch.setitem(app.config, 'TENANT_DATABASE_DIR', str(tmp_path))
+    with app.app_context(), use_tenant('east'):
+        app_module.create_schema()
+    yield
+    app_module.shard_engines.dispose_all()
+
+
+def test_each_branch_sees_only_its_own_books(app, shards, client):
+    add_book('Main Street Atlas')
+    with use_tenant('east'):
+        add_book('East Side Story')
+
+    main_page = client.get('/').data
+    east_page = client.get('/', headers=EAST).data
+
+    assert b'Main Street Atlas' in main_page and b'East Side Story' not in main_page
+    assert b'East Side Story' in east_page and b'Main Street Atlas' not in east_page
+
+
+def test_unknown_or_malformed_branches_are_not_found(app, shards, client):
+    assert client.get('/', headers={'X-Library-Tenant': 'west'}).status_code == 404
+    assert client.get('/', headers={'X-Library-Tenant': '../library'}).status_code == 404
+    assert client.get('/', headers={'X-Library-Tenant': 'main'}).status_code == 200
+
+
+def test_cached_pages_and_validators_are_per_branch(app, shards, client, monkeypatch):
+    monkeypatch.setattr(app_module.page_cache, 'max_entries', 512)
+    add_book('Main Street Atlas')
+    main = client.get('/authors')
+    east = client.get('/authors', headers=EAST)
+
+    assert main.headers['ETag'] != east.headers['ETag']
+    assert 'X-Library-Tenant' in main.headers['Vary']
+    assert client.get('/authors', headers={**EAST, 'If-None-Match': main.headers['ETag']}).status_code == 200
+
+
+def test_writes_go_to_the_requesting_branch(app, shards, client):
+    client.post('/author/new', data={'name': 'Eastern Author', 'biography': ''}, headers=EAST)
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            main_names = conn.execute(select(app_module.Author.name)).scalars().all()
+        with use_tenant('east'), db.engine.connect() as conn:
+            east_names = conn.execute(select(app_module.Author.name)).scalars().all()
+    assert 'Eastern Author' in east_names and 'Eastern Author' not in main_names
+
+
+def test_search_across_branches_merges_and_labels_results(app, shards, client):
+    add_book('Harbour Lights')
+    with use_tenant('east'):
+        add_book('Harbour Tides')
+
+    single = client.post('/book/search', data={'search_term': 'harbour'}).data
+    merged = client.post('/book/search', data={'search_term': 'harbour', 'scope': 'all'}).data
+
+    assert b'Harbour Lights' in single and b'Harbour Tides' not in single
+    assert b'Harbour Lights' in merged and b'Harbour Tides' in merged
+
+
+def test_report_across_branches_sums_counts_by_name(app, shards):
+    genre = add_named(Genre, 'Maritime')
+    add_book('Harbour Lights', genres=[genre])
+    with use_tenant('east'):
+        east_genre = add_named(Genre, 'Maritime')
+        add_book('Harbour Tides', genres=[east_genre])
+        add_book('Harbour Fog', genres=[east_genre])
+
+    with app.test_request_context('/reports/books_by_genre?scope=all'):
+        rows, _ = app_module.fetch_report_all_branches('books_by_genre', 10, 0)
+
+    assert {'genre_name': 'Maritime', 'book_count': 3} in rows
+
+
+def test_jobs_run_against_the_branch_they_were_queued_from(app, shards, client):
+    response = client.post('/api/v1/jobs', json={'kind': 'rebuild_stats', 'params': {'tenant': 'main'}},
+                           headers=EAST)
+    job_id = response.get_json()['id']
+
+    assert client.get(f'/api/v1/jobs/{job_id}', headers=EAST).get_json()['params'] == {'tenant': 'east'}
+    assert client.get(f'/api/v1/jobs/{job_id}').status_code == 404
+    with app.app_context():
+        job_worker_loop('test', drain=True)
+        with db.engine.connect() as conn:
+            assert conn.execute(select(Job.status).where(Job.id == job_id)).scalar() == 'succeeded'
+
+
+def test_async_and_wsgi_views_send_the_same_validators(app, catalog, client):
+    pytest.importorskip('aiosqlite')
+    import asgi
+
+    add_book('Main Street Atlas')
+    _, headers, _ = run_async(lambda: asgi_request(asgi.application, 'GET', '/'))
+    assert headers['etag'] == client.get('/').headers['ETag']
+
+
+def test_tenant_list_is_cached_until_a_branch_is_created(app, shards, client, monkeypatch):
+    assert client.get('/', headers=EAST).status_code == 200
+    scans = []
+    real_listdir = app_module.os.listdir
+    monkeypatch.setattr(app_module.os, 'listdir', lambda path: scans.append(path) or real_listdir(path))
+
+    assert client.get('/', headers=EAST).status_code == 200
+    assert client.get('/', headers={'X-Library-Tenant': 'west'}).status_code == 404
+    assert scans == []
+
+    with app.app_context(), use_tenant('west'):
+        app_module.create_schema()
+    assert client.get('/', headers={'X-Library-Tenant': 'west'}).status_code == 200
+    assert len(scans) == 1
+
+
+def test_open_shard_engines_are_reused_and_evicted_only_on_open(app, shards, monkeypatch):
+    monkeypatch.setitem(app.config, 'TENANT_ENGINE_MAX_OPEN', 2)
+    engines = app_module.ShardEngines()
+    evictions = []
+    real_evict = engines._evict
+    monkeypatch.setattr(engines, '_evict', lambda now: evictions.append(now) or real_evict(now))
+
+    with app.app_context():
+        north = engines.get('north')
+        south = engines.get('south')
+        assert engines.get('north') is north
+        assert len(evictions) == 2
+
+        engines.get('west')  # south is now the least recently used
+        assert engines.get('north') is north
+        assert engines.get('south') is not south
+    assert len(evictions) == 4
+    engines.dispose_all()
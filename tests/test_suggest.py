@@ -0,0 +1,45 @@
+from app import Author, PrefixIndex, Publisher
+
+from conftest import add_book, add_named
+
+
+def names(results):
+    return [result['name'] for result in results]
+
+
+def test_prefix_index_matches_the_start_of_any_word():
+    index = PrefixIndex([(1, 'Jane Austen'), (2, 'Austen Press'), (3, 'Paul Auster'), (4, 'Causeway')])
+
+    assert names(index.search('aus', 10)) == ['Jane Austen', 'Austen Press', 'Paul Auster']
+    assert names(index.search('  AUSTEN  ', 10)) == ['Jane Austen', 'Austen Press']
+    assert names(index.search('jane aus', 10)) == ['Jane Austen']
+    assert index.search('use', 10) == []  # not the middle of a word
+    assert index.search('', 10) == []
+
+
+def test_prefix_index_lists_each_name_once_up_to_the_limit():
+    index = PrefixIndex([(1, 'Anna Anna'), (2, 'Anne'), (3, 'Annie')])
+
+    assert names(index.search('ann', 10)) == ['Anna Anna', 'Anne', 'Annie']
+    assert len(index.search('ann', 2)) == 2
+
+
+def test_suggest_endpoint_sees_new_names_after_a_write(app, catalog, client):
+    add_named(Author, 'Jane Austen')
+    assert names(client.get('/api/suggest/author?q=jan').get_json()['data']) == ['Jane Austen']
+
+    client.post('/author/new', data={'name': 'Janet Frame', 'biography': ''})
+
+    assert names(client.get('/api/suggest/author?q=jan').get_json()['data']) == ['Jane Austen', 'Janet Frame']
+    assert client.get('/api/suggest/loans?q=a').status_code == 404
+
+
+def test_book_form_renders_only_the_books_own_choices(app, catalog, client):
+    chosen = add_named(Author, 'Chosen Author')
+    add_named(Author, 'Someone Else')
+    add_named(Publisher, 'Unrelated Press')
+    book = add_book('Picked', authors=[chosen])
+
+    assert b'Someone Else' not in client.get('/book/new').data
+    form = client.get(f'/book/edit/{book}').data
+    assert b'Chosen Author' in form and b'Someone Else' not in form and b'Unrelated Press' not in form
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from app import preload_templates
+
+
+@pytest.fixture
+def fresh_jinja_env(app):
+    # Force a real compile of every template and restore the session's cache afterwards
+    env = app.jinja_env
+    bytecode_cache = env.bytecode_cache
+    env.cache.clear()
+    yield env
+    env.cache.clear()
+    env.bytecode_cache = bytecode_cache
+
+
+def test_preload_compiles_every_template_into_the_bytecode_cache(app, fresh_jinja_env, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'jinja_cache'
+    monkeypatch.setitem(app.config, 'TEMPLATE_BYTECODE_CACHE_DIR', str(cache_dir))
+
+    preload_templates()
+
+    templates = fresh_jinja_env.list_templates()
+    assert len(os.listdir(cache_dir)) == len(templates)
+    assert len(fresh_jinja_env.cache) == len(templates)
+
+
+def test_preload_without_a_writable_cache_dir_still_compiles(app, fresh_jinja_env, tmp_path, monkeypatch):
+    # A path below a regular file can never be created, like a read-only filesystem
+    blocker = tmp_path / 'not-a-dir'
+    blocker.write_text('')
+    monkeypatch.setitem(app.config, 'TEMPLATE_BYTECODE_CACHE_DIR', str(blocker / 'jinja_cache'))
+
+    preload_templates()
+
+    assert fresh_jinja_env.bytecode_cache is None
+    assert len(fresh_jinja_env.cache) == len(fresh_jinja_env.list_templates())